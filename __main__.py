@@ -1,18 +1,101 @@
 import logging
+import multiprocessing
 import os
+import signal
 
 import click
 
 from core.client import Venus
+from core.recording import replay as run_replay
 
 @click.group()
 def venus():
     pass
 
+def start_worker(**options):
+    client = Venus(log_level=int(os.environ.get("LOG_LEVEL", logging.WARN)), **options)
+    client.run()
+
+def worker_options(func):
+    """Options shared by commands which run a worker"""
+    options = [
+        click.option("--min-interval", default=10.0, show_default=True, help="Shortest polling interval for a wiki, in seconds."),
+        click.option("--max-interval", default=300.0, show_default=True, help="Longest polling interval for a quiet wiki, in seconds."),
+        click.option("--fetch-limit", default=100, show_default=True, help="How many requests to wikis may run at once."),
+        click.option("--fetch-host-limit", default=4, show_default=True, help="How many requests to a single host may run at once."),
+        click.option("--checkpoint-interval", default=5.0, show_default=True, help="How often wikis' check times are saved, in seconds."),
+        click.option("--rebalance-interval", default=30.0, show_default=True, help="How often wikis are redistributed between workers, in seconds."),
+        click.option("--metrics-port", type=int, help="Port to serve Prometheus metrics on. With several workers, each worker uses the next port."),
+        click.option("--metrics-per-wiki", is_flag=True, help="Also expose latency histograms for every wiki."),
+        click.option("--admin-port", type=int, help="Port to serve /debug/profile on, only on 127.0.0.1. With several workers, each worker uses the next port."),
+        click.option("--profile-directory", default="profiles", show_default=True, help="Where profiles are saved. Send SIGUSR1 or request /debug/profile on the admin port to take one."),
+        click.option("--profile-cycles", default=10, show_default=True, help="How many poll cycles SIGUSR1 profiles."),
+        click.option("--profile-continuous", is_flag=True, help="Keep sampling at a low rate and save a profile every 5 minutes."),
+        click.option("--user-cache-size", default=5000, show_default=True, help="How many user ids are cached per wiki."),
+        click.option("--user-cache-ttl", default=86400.0, show_default=True, help="How long user ids are cached, in seconds."),
+        click.option("--persist-user-ids", is_flag=True, help="Also save user ids to the database, so the cache stays warm after restarts."),
+        click.option("--discord-connections", default=50, show_default=True, help="How many connections to Discord may be open at once."),
+        click.option("--keepalive-timeout", default=30.0, show_default=True, help="How long idle HTTP connections are kept open, in seconds."),
+        click.option("--dns-ttl", default=300, show_default=True, help="How long DNS lookups are cached, in seconds."),
+        click.option("--retries", default=2, show_default=True, help="How many times a failed request to a wiki is retried."),
+        click.option("--siteinfo-ttl", default=86400.0, show_default=True, help="How often wikis' names, namespaces and paths are refreshed, in seconds."),
+    ]
+    for option in reversed(options):
+        func = option(func)
+    return func
+
 @venus.command(help="Runs the logger")
-def run():
+@click.option("--workers", default=1, show_default=True, help="Number of worker processes. Wikis are split between all workers connected to the database, including ones on other hosts.")
+@click.option("--max-in-flight", default=1, show_default=True, help="How many fetched cycles of a wiki may wait for delivery at once.")
+@worker_options
+def run(workers, metrics_port, admin_port, **options):
+    if workers == 1:
+        start_worker(workers=workers, metrics_port=metrics_port, admin_port=admin_port, **options)
+        return
+
+    processes = [
+        multiprocessing.Process(
+            target=start_worker,
+            kwargs=dict(workers=workers, metrics_port=metrics_port and metrics_port + i, admin_port=admin_port and admin_port + i, **options),
+            name=f"venus-worker-{i}"
+        )
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    def stop(signum, frame):
+        for process in processes:
+            process.terminate()
+    signal.signal(signal.SIGTERM, stop)
+    # SIGINT is delivered to the whole process group, so workers receive it on their own
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    for process in processes:
+        process.join()
+
+@venus.command(help="Runs a single worker which also saves raw responses of wikis to DIRECTORY")
+@click.argument("directory", type=click.Path(file_okay=False))
+@worker_options
+def record(directory, **options):
+    # recorded cycles must not overlap, otherwise their responses would be mixed up
+    start_worker(workers=1, max_in_flight=1, record_directory=directory, **options)
+
+@venus.command(help="Replays cycles recorded to DIRECTORY through handlers without network or database")
+@click.argument("directory", type=click.Path(exists=True, file_okay=False))
+@click.option("--render", is_flag=True, help="Also prepare Discord messages for every entry.")
+def replay(directory, render):
     client = Venus(log_level=int(os.environ.get("LOG_LEVEL", logging.WARN)))
-    client.run()
+    try:
+        stats = client.loop.run_until_complete(run_replay(client, directory, render=render))
+    finally:
+        client.loop.run_until_complete(client.session.close())
+        client.loop.run_until_complete(client.discord_session.close())
+
+    elapsed = stats.pop("elapsed")
+    for name, value in stats.items():
+        click.echo(f"{name:<10} {value:>10,} ({value / elapsed:,.0f}/s)")
+    click.echo(f"{'elapsed':<10} {elapsed:>10.3f}s")
 
 @venus.command(help="Adds a new wiki")
 def add_wiki():
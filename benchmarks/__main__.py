@@ -0,0 +1,177 @@
+"""Microbenchmarks for handlers and Discord rendering.
+
+Run from the repository root:
+
+    python -m benchmarks                    # print results
+    python -m benchmarks --save             # also save them as the new baseline
+    python -m benchmarks --compare          # flag cases which got slower than the baseline
+
+Everything runs offline, no database or network is required.
+"""
+import asyncio
+import datetime
+import json
+import logging
+import pathlib
+import platform
+import sys
+import time
+from typing import Callable
+
+import aiohttp
+import click
+import fluent.runtime
+
+from benchmarks.fixtures import WIKI_URL, Fixtures
+from core import decoding
+from core.entry import Entry
+from core.metrics import Metrics
+from fandom.schemas import MWQueryResponse, PostsResponse
+from fandom.wiki import Wiki
+from handlers.discussions import DiscussionsHandler
+from handlers.rc import RCHandler
+from transports.discord import DiscordTransport
+
+BASELINE = pathlib.Path(__file__).parent / "baseline.json"
+WEBHOOK_URL = "https://discord.com/api/webhooks/100000000000000000/" + "a" * 68
+
+
+class BenchClient:
+    """Stands in for `Venus` with everything handlers and transports use, but no database"""
+
+    def __init__(self, session: aiohttp.ClientSession):
+        self.session = session
+        self.discord_session = session
+        self.logger = logging.getLogger("venus.benchmarks")
+        self.logger.setLevel(logging.CRITICAL)
+        loader = fluent.runtime.FluentResourceLoader("strings/{locale}")
+        self.l10n = fluent.runtime.FluentLocalization(["ru"], ["main.ftl"], loader)
+        self.metrics = Metrics(self)
+        self.user_cache_size = 5000
+        self.user_cache_ttl = 86400
+
+
+def measure(func: Callable[[], int], repeat: int) -> float:
+    """Runs `func` `repeat` times and returns the best rate of items per second. `func` returns the number of items it processed"""
+    best = float("inf")
+    items = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = func()
+        best = min(best, time.perf_counter() - start)
+    return items / best
+
+
+def make_cases(client: BenchClient, scale: int) -> dict[str, Callable[[], int]]:
+    fixtures = Fixtures()
+    wiki = Wiki(1, WIKI_URL, fixtures.now, client)  # type: ignore
+    wiki.name = "Bench Wiki"
+    wiki.prev_check_time = datetime.datetime(2000, 1, 1)
+
+    rc_data = fixtures.query(edits=50 * scale, logs=26 * scale)
+    activity, posts = fixtures.discussions(actions=12 * scale)
+    documents = [json.loads(post["jsonModel"]) for post in posts["_embedded"]["doc:posts"]]
+    summaries = fixtures.summaries(100 * scale)
+    rc_body = json.dumps(rc_data).encode()
+    posts_body = json.dumps(posts).encode()
+
+    rc_handler = RCHandler(client, wiki)
+    discussions_handler = DiscussionsHandler(client, wiki)  # type: ignore
+    transport = DiscordTransport(wiki, WEBHOOK_URL, 0b111, client)
+
+    entries: list[Entry] = rc_handler.handle(rc_data) + discussions_handler.handle(activity, posts)
+
+    def decode_rc():
+        data = decoding.decode(rc_body, MWQueryResponse)
+        return sum(len(rows) for rows in data["query"].values())
+
+    def decode_posts():
+        return len(decoding.decode(posts_body, PostsResponse)["_embedded"]["doc:posts"])
+
+    def rc_handle():
+        return len(rc_handler.handle(rc_data))
+
+    def discussions_handle():
+        return len(discussions_handler.handle(activity, posts))
+
+    def parse_text_from_json():
+        for document in documents:
+            discussions_handler.parse_text_from_json(document)
+        return len(documents)
+
+    def render_summary():
+        # the first pass renders every distinct summary, the rest come from the cache like in real cycles
+        wiki.summaries.clear()
+        for summary in summaries:
+            rc_handler.render_summary(summary)
+        return len(summaries)
+
+    def discord_prepare():
+        for entry in entries:
+            transport.prepare(entry)
+        return len(entries)
+
+    return {
+        "decode recentchanges": decode_rc,
+        "decode posts": decode_posts,
+        "RCHandler.handle": rc_handle,
+        "DiscussionsHandler.handle": discussions_handle,
+        "DiscussionsHandler.parse_text_from_json": parse_text_from_json,
+        "RCHandler.render_summary": render_summary,
+        "DiscordTransport.prepare": discord_prepare,
+    }
+
+
+async def run_cases(scale: int, repeat: int, only: tuple[str, ...]) -> dict[str, float]:
+    async with aiohttp.ClientSession() as session:
+        cases = make_cases(BenchClient(session), scale)
+        return {
+            name: measure(case, repeat)
+            for name, case in cases.items()
+            if not only or any(pattern in name for pattern in only)
+        }
+
+
+@click.command(help="Runs handler and transport microbenchmarks")
+@click.option("--scale", default=10, show_default=True, help="Size multiplier of generated fixtures.")
+@click.option("--repeat", default=5, show_default=True, help="How many times to run each case. The best run is reported.")
+@click.option("--only", multiple=True, help="Run only cases which names contain this string.")
+@click.option("--baseline", type=click.Path(dir_okay=False, path_type=pathlib.Path), default=BASELINE, show_default=True)
+@click.option("--save", is_flag=True, help="Save results as the new baseline.")
+@click.option("--compare", is_flag=True, help="Compare results with the baseline and fail on regressions.")
+@click.option("--threshold", default=0.1, show_default=True, help="Slowdown relative to the baseline which counts as a regression.")
+def main(scale, repeat, only, baseline, save, compare, threshold):
+    results = asyncio.run(run_cases(scale, repeat, only))
+
+    previous = {}
+    if compare:
+        if not baseline.exists():
+            raise click.ClickException(f"There is no baseline at {baseline}, create one with --save")
+        previous = json.loads(baseline.read_text())["results"]
+
+    regressions = []
+    for name, rate in results.items():
+        line = f"{name:<42} {rate:>12,.0f} entries/s"
+        if name in previous:
+            change = rate / previous[name] - 1
+            line += f"  {change:+.1%}"
+            if change < -threshold:
+                line += "  REGRESSION"
+                regressions.append(name)
+        click.echo(line)
+
+    if save:
+        baseline.write_text(json.dumps({
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "scale": scale,
+            "results": results,
+        }, indent=4))
+        click.echo(f"Saved baseline to {baseline}")
+
+    if regressions:
+        click.echo(f"{len(regressions)} case(s) are more than {threshold:.0%} slower than the baseline", err=True)
+        sys.exit(1)
+
+
+main()
@@ -0,0 +1,231 @@
+"""Synthetic, but realistic API responses used by benchmarks"""
+import datetime
+import json
+import random
+from urllib.parse import quote
+
+WIKI_URL = "https://bench.fandom.com"
+
+USERS = ["Black Spaceship", "Example user", "Bot of the wiki", "Some_Anon", "Администратор", "User with a very long name 1234"]
+PAGES = ["Main Page", "Venus", "Category:Planets", "File:Venus.png", "Template:Infobox planet", "Солнечная система", "User blog:Example user/Post"]
+SUMMARIES = [
+    "",
+    "typo",
+    "/* History */ added info about [[Venus|the planet]]",
+    "Reverted edits by [[Special:Contributions/Some_Anon|Some_Anon]] ([[User talk:Some_Anon|talk]]) to last revision by [[User:Black Spaceship|Black Spaceship]]",
+    "Moved [[Venus (planet)]] to [[Venus]]: better name, see [[Forum:Naming|discussion]] and [[Help:Renaming|]]",
+    "Bot: updating [[Category:Planets]] for [[Mercury]], [[Venus]], [[Earth]] and [[Mars]]s",
+    "Created page with \"'''Venus''' is the second planet from the [[Sun]]\"",
+    "/* Atmosphere */ added data from [https://nssdc.gsfc.nasa.gov/planetary/factsheet/venusfact.html NASA fact sheet]",
+]
+GROUPS = ["sysop", "bureaucrat", "content-moderator", "threadmoderator", "rollback", "bot"]
+
+
+def mw_timestamp(time: datetime.datetime) -> str:
+    return time.replace(microsecond=0).isoformat() + "Z"
+
+
+class Fixtures:
+    """Generates responses of Fandom api. The same seed always produces the same data"""
+
+    def __init__(self, seed: int = 0, now: datetime.datetime | None = None, span: int = 3600):
+        self.random = random.Random(seed)
+        self.now = now or datetime.datetime(2023, 2, 14, 12, 0, 0)
+        self.span = span    # generated entries happened within `span` seconds before `now`
+        self.next_id = 1000
+
+    def _id(self) -> int:
+        self.next_id += 1
+        return self.next_id
+
+    def _time(self) -> datetime.datetime:
+        return self.now - datetime.timedelta(seconds=self.random.randrange(0, self.span))
+
+    def _user(self) -> dict:
+        return {"user": self.random.choice(USERS), "userid": self.random.randrange(1, 50_000_000)}
+
+    def _page(self) -> dict:
+        title = self.random.choice(PAGES)
+        return {"title": title, "ns": 6 if title.startswith("File:") else 0, "pageid": self.random.randrange(1, 100_000)}
+
+    # MediaWiki
+
+    def recent_change(self) -> dict:
+        revid = self._id()
+        return {
+            "type": self.random.choice(["edit", "edit", "edit", "new"]),
+            **self._page(),
+            **self._user(),
+            "rcid": self._id(),
+            "revid": revid,
+            "old_revid": revid - self.random.randrange(1, 100),
+            "oldlen": self.random.randrange(0, 50_000),
+            "newlen": self.random.randrange(0, 50_000),
+            "timestamp": mw_timestamp(self._time()),
+            "comment": self.random.choice(SUMMARIES),
+        }
+
+    def log_event(self, type: str, action: str) -> dict:
+        event = {
+            "logid": self._id(),
+            "type": type,
+            "action": action,
+            **self._page(),
+            **self._user(),
+            "timestamp": mw_timestamp(self._time()),
+            "comment": self.random.choice(SUMMARIES),
+            "params": {},
+        }
+        expiry = mw_timestamp(self.now + datetime.timedelta(days=self.random.randrange(1, 30)))
+        if type == "move":
+            event["params"] = {"target_ns": 0, "target_title": self.random.choice(PAGES), "suppressredirect": ""}
+        elif type == "protect" and action != "unprotect":
+            event["params"] = {
+                "description": "",
+                "cascade": "",
+                "details": [
+                    {"type": "edit", "level": "sysop", "expiry": expiry},
+                    {"type": "move", "level": "autoconfirmed", "expiry": "infinite"},
+                ],
+            }
+        elif type in ("block", "rights"):
+            event["title"] = "User:" + self.random.choice(USERS)
+            event["ns"] = 2
+            if type == "block" and action != "unblock":
+                event["params"] = {"duration": "1 week", "flags": ["nocreate", "noautoblock"], "expiry": expiry}
+            elif type == "rights":
+                event["params"] = {
+                    "oldgroups": [], "newgroups": [],
+                    "oldmetadata": [{"group": "rollback", "expiry": "infinity"}],
+                    "newmetadata": [
+                        {"group": "rollback", "expiry": "infinity"},
+                        {"group": self.random.choice(GROUPS), "expiry": expiry},
+                    ],
+                }
+        return event
+
+    def query(self, edits: int, logs: int) -> dict:
+        """Response of api.php with recentchanges and logevents of every supported type"""
+        kinds = [
+            ("move", "move"), ("delete", "delete"), ("delete", "restore"),
+            ("upload", "upload"), ("upload", "overwrite"), ("upload", "revert"),
+            ("protect", "protect"), ("protect", "modify"), ("protect", "unprotect"),
+            ("block", "block"), ("block", "reblock"), ("block", "unblock"),
+            ("rights", "rights"),
+        ]
+        return {
+            "batchcomplete": "",
+            "query": {
+                "recentchanges": [self.recent_change() for _ in range(edits)],
+                "logevents": [self.log_event(*kinds[i % len(kinds)]) for i in range(logs)],
+            },
+        }
+
+    def summaries(self, count: int) -> list[str]:
+        return [self.random.choice(SUMMARIES) for _ in range(count)]
+
+    # Discussions
+
+    def json_model(self, paragraphs: int = 3) -> dict:
+        """A jsonModel document of a post"""
+        def text(value, *marks):
+            node = {"type": "text", "text": value}
+            if marks:
+                node["marks"] = list(marks)
+            return node
+
+        content = []
+        for _ in range(paragraphs):
+            content.append({"type": "paragraph", "content": [
+                text("Venus is the second planet from the Sun. "),
+                text("It is bright", {"type": "strong"}),
+                text(" and "),
+                text("hot", {"type": "em"}, {"type": "strong"}),
+                text(", see "),
+                text("the wiki", {"type": "link", "attrs": {"href": WIKI_URL + "/wiki/Venus"}}),
+                text("."),
+            ]})
+        content.append({"type": "bulletList", "content": [
+            {"type": "listItem", "content": [{"type": "paragraph", "content": [text(f"item {i}")]}]} for i in range(3)
+        ]})
+        content.append({"type": "orderedList", "content": [
+            {"type": "listItem", "content": [{"type": "paragraph", "content": [text(f"step {i}")]}]} for i in range(3)
+        ]})
+        content.append({"type": "code_block", "content": [text("print('hello')")]})
+        content.append({"type": "paragraph"})
+        return {"type": "doc", "content": content}
+
+    def _link(self, tracking: str, href: str, text: str) -> str:
+        return f'<a href="{href}" data-tracking="{tracking}">{text}</a>'
+
+    def activity_label(self, action_type: str, content_type: str, thread_id: int, post_id: int) -> str:
+        """HTML label of an ActivityApiController action"""
+        user = self.random.choice(USERS)
+        author = self._link(f"action-username__{content_type}", f"{WIKI_URL}/wiki/User:{quote(user.replace(' ', '_'))}", user)
+        snippet = "<em>Venus is the second planet from the Sun &amp; the hottest one</em>"
+        title = "Is Venus <b>really</b> that hot?"
+        owner = quote(self.random.choice(USERS).replace(" ", "_"))
+        page = self.random.choice(PAGES)
+
+        if content_type == "post":
+            parts = [
+                self._link("action-post__post", f"{WIKI_URL}/f/p/{thread_id}", title),
+                self._link("action-category__post", f"{WIKI_URL}/f?catId=4400000000000000001", "General"),
+                self._link("action-view__post", f"{WIKI_URL}/f/p/{thread_id}", "View"),
+            ]
+        elif content_type == "post-reply":
+            parts = [
+                self._link("action-post-reply__post-reply", f"{WIKI_URL}/f/p/{thread_id}", title),
+                self._link("action-post-reply-category__post-reply", f"{WIKI_URL}/f?catId=4400000000000000001", "General"),
+                self._link("action-view__post-reply", f"{WIKI_URL}/f/p/{thread_id}/r/{post_id}", "View"),
+            ]
+        elif content_type == "message":
+            parts = [
+                self._link("action-wall-message__message", f"{WIKI_URL}/wiki/Message_Wall:{owner}?threadId={thread_id}", title),
+                self._link("action-view__message", f"{WIKI_URL}/wiki/Message_Wall:{owner}?threadId={thread_id}", "View"),
+            ]
+        elif content_type == "message-reply":
+            parts = [
+                self._link("action-reply-message-wall-parent__message-reply", f"{WIKI_URL}/wiki/Message_Wall:{owner}?threadId={thread_id}", title),
+                self._link("action-view__message-reply", f"{WIKI_URL}/wiki/Message_Wall:{owner}?threadId={thread_id}#{post_id}", "View"),
+            ]
+        elif content_type == "comment":
+            parts = [
+                self._link("action-comment-article-name__comment", f"{WIKI_URL}/wiki/{quote(page)}", page),
+                self._link("action-view__comment", f"{WIKI_URL}/wiki/{quote(page)}?commentId={thread_id}", "View"),
+            ]
+        else:
+            parts = [
+                self._link("action-reply-article-name__comment-reply", f"{WIKI_URL}/wiki/{quote(page)}", page),
+                '<span data-tracking="action-reply-parent__comment-reply">Original comment text</span>',
+                self._link("action-view__comment-reply", f"{WIKI_URL}/wiki/{quote(page)}?commentId={thread_id}&replyId={post_id}", "View"),
+            ]
+        verb = "created" if action_type == "create" else "edited"
+        return f'<div class="activity">{author} {verb} {" in ".join(parts)} {snippet}</div>'
+
+    def discussions(self, actions: int, step: datetime.timedelta = datetime.timedelta(minutes=1)) -> tuple[list, dict]:
+        """Returns social activity and the matching getPosts response. Actions are `step` apart, the newest one happened `now`"""
+        content_types = ["post", "post-reply", "message", "message-reply", "comment", "comment-reply"]
+        days: dict[str, list] = {}
+        posts = []
+        for i in range(actions):
+            content_type = content_types[i % len(content_types)]
+            action_type = "update" if i % 5 == 4 else "create"
+            thread_id, post_id = self._id(), self._id()
+            time = self.now - step * i
+            days.setdefault(time.strftime("%d %B %Y"), []).append({
+                "actionType": action_type,
+                "contentType": content_type,
+                "time": time.strftime("%H:%M"),
+                "label": self.activity_label(action_type, content_type, thread_id, post_id),
+            })
+            if action_type == "create":
+                posts.append({
+                    "id": str(post_id),
+                    "threadId": str(thread_id),
+                    "isReply": content_type.endswith("-reply"),
+                    "creationDate": {"epochSecond": int(time.timestamp())},
+                    "jsonModel": json.dumps(self.json_model(self.random.randrange(1, 6))),
+                })
+        activity = [{"date": date, "actions": day_actions} for date, day_actions in days.items()]
+        return activity, {"_embedded": {"doc:posts": posts}}
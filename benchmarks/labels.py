@@ -0,0 +1,88 @@
+"""Checks that `parse_label` extracts the same text and links from social activity labels as BeautifulSoup.
+
+Run from the repository root, with development dependencies installed:
+
+    python -m benchmarks.labels
+
+Labels of every action and content type generated by the fixtures are checked, along with
+hand written ones covering markup real labels may have. Exits with status 1 on any difference.
+By default BeautifulSoup picks the parser itself, like DiscussionsHandler did before; `--parser` picks one explicitly.
+"""
+import sys
+import warnings
+
+import click
+from bs4 import BeautifulSoup
+
+from benchmarks.fixtures import Fixtures
+from handlers.labels import parse_label
+
+CONTENT_TYPES = ["post", "post-reply", "message", "message-reply", "comment", "comment-reply"]
+
+EDGE_CASES = [
+    # nested markup, entities and character references
+    '<a data-tracking="action-post__post" href="/f/p/1">Is <b>Venus <i>really</i></b> &quot;hot&quot;&#33;</a> <em>a &lt; b</em>',
+    # void elements and self closing tags inside tracked ones
+    '<a data-tracking="action-username__post" href="/wiki/User:A">A<br>B<img src="x.png"/>C</a><em>x<br/>y</em>',
+    # the first element with the same value wins, as does the first <em>
+    '<a data-tracking="t" href="/1">first</a><a data-tracking="t" href="/2">second</a><em>one</em><em>two</em>',
+    # elements which are never closed
+    '<span data-tracking="action-reply-parent__comment-reply">unclosed <b>bold</span> <em>snippet',
+    # tracked elements without href, nested tracked elements and comments
+    '<div data-tracking="outer">a<!-- hidden --><a data-tracking="inner" href="/in">b</a>c</div>',
+    # uppercase names, unquoted and single quoted attributes, entities in links
+    "<A HREF='/f?catId=1&amp;sort=latest' DATA-TRACKING=action-category__post>General</A> <EM>Snippet</EM>",
+    # self closing elements which aren't void
+    '<a data-tracking="empty" href="/e"/>after<em/>text',
+    # an <em> inside a tracked element
+    '<a data-tracking="t" href="/t">title <em>emphasis</em></a>',
+    # ">" inside quoted attribute values
+    '<a title="a>b" data-tracking="action-post__post" href="/f/p/1">Title</a> <em class=\'x>y\'>Snippet</em>',
+    # a quote which is never closed
+    '<a data-tracking="t" href="/t" title=it\'s>text</a>',
+]
+
+
+def soup_extract(html: str, parser: str | None = None) -> tuple[dict[str, tuple[str, str | None]], str | None]:
+    with warnings.catch_warnings():
+        # BeautifulSoup warns when it has to pick the parser
+        warnings.simplefilter("ignore")
+        soup = BeautifulSoup(html, parser)
+    elements = {}
+    for element in soup.find_all(attrs={"data-tracking": True}):
+        tracking = element["data-tracking"]
+        if tracking not in elements:
+            elements[tracking] = (element.text, element.get("href"))
+    em = soup.find("em")
+    return elements, em.text if em is not None else None
+
+
+def labels() -> list[str]:
+    fixtures = Fixtures()
+    return [
+        fixtures.activity_label(action_type, content_type, 100 + i, 200 + i)
+        for i, content_type in enumerate(CONTENT_TYPES)
+        for action_type in ("create", "update")
+    ] + EDGE_CASES
+
+
+@click.command(help="Compares parse_label with BeautifulSoup")
+@click.option("--parser", help="Parser BeautifulSoup uses, like html.parser or lxml. Picked by BeautifulSoup itself by default.")
+def main(parser):
+    failures = 0
+    checked = labels()
+    for html in checked:
+        label = parse_label(html)
+        expected = soup_extract(html, parser)
+        actual = ({tracking: tuple(element) for tracking, element in label.elements.items()}, label.em)
+        if actual != expected:
+            failures += 1
+            click.echo(f"Mismatch for {html!r}:\n  BeautifulSoup: {expected!r}\n  parse_label:   {actual!r}", err=True)
+
+    click.echo(f"Checked {len(checked)} labels, {failures} mismatch(es)")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
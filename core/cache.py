@@ -0,0 +1,46 @@
+import collections
+import time
+from typing import Callable, Generic, Hashable, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """Mapping with a size limit and a time to live. Once full, the least recently used items are evicted first"""
+
+    def __init__(self, maxsize: int = 1000, ttl: float = 86400, *, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._items: collections.OrderedDict[K, tuple[V, float]] = collections.OrderedDict()    # key -> (value, expiry)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key: K) -> bool:
+        return self.get(key) is not None
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        item = self._items.get(key)
+        if item is None:
+            return default
+        value, expiry = item
+        if expiry <= self.clock():
+            del self._items[key]
+            return default
+        self._items.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V):
+        self._items[key] = (value, self.clock() + self.ttl)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def pop(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        item = self._items.pop(key, None)
+        return default if item is None else item[0]
+
+    def clear(self):
+        self._items.clear()
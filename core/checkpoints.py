@@ -0,0 +1,81 @@
+import asyncio
+import datetime
+from typing import TYPE_CHECKING, NamedTuple, Optional
+
+if TYPE_CHECKING:
+    from core.client import Venus
+
+
+class Checkpoint(NamedTuple):
+    """Position up to which a wiki's data was delivered"""
+    time: datetime.datetime
+    rcid: Optional[int] = None
+    logid: Optional[int] = None
+    rc_resume_time: Optional[datetime.datetime] = None   # set if recent changes were handled only up to this time
+
+
+class CheckpointWriter:
+    """Collects wikis' last check times and recent changes cursors and saves them to the database in batches.
+
+    Checkpoints are flushed every `interval` seconds, or as soon as `batch_size` wikis
+    are waiting. Callers must only add a checkpoint once the wiki's data was delivered.
+    """
+
+    def __init__(self, client: "Venus", *, interval: float = 5, batch_size: int = 500):
+        self.client = client
+        self.interval = interval
+        self.batch_size = batch_size
+        self._pending: dict[int, Checkpoint] = {}
+        self._full = asyncio.Event()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, wiki_id: int, checkpoint: Checkpoint):
+        """Queues wiki's checkpoint to be saved"""
+        self._pending[wiki_id] = checkpoint
+        if len(self._pending) >= self.batch_size:
+            self._full.set()
+
+    async def flush(self):
+        """Saves all queued checkpoints in one statement"""
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, {}
+        self._full.clear()
+        try:
+            async with self.client.acquire() as conn:
+                await conn.execute(
+                    """UPDATE wikis SET last_check_time = checkpoints.time,
+                                        last_rcid = coalesce(checkpoints.rcid, wikis.last_rcid),
+                                        last_logid = coalesce(checkpoints.logid, wikis.last_logid),
+                                        rc_resume_time = checkpoints.rc_resume_time
+                       FROM unnest($1::integer[], $2::timestamp[], $3::bigint[], $4::bigint[], $5::timestamp[])
+                            AS checkpoints(id, time, rcid, logid, rc_resume_time)
+                       WHERE wikis.id = checkpoints.id""",
+                    list(batch.keys()),
+                    [checkpoint.time for checkpoint in batch.values()],
+                    [checkpoint.rcid for checkpoint in batch.values()],
+                    [checkpoint.logid for checkpoint in batch.values()],
+                    [checkpoint.rc_resume_time for checkpoint in batch.values()]
+                )
+        except Exception:
+            # keep checkpoints which weren't replaced by newer ones in the meantime for the next flush
+            for wiki_id, checkpoint in batch.items():
+                self._pending.setdefault(wiki_id, checkpoint)
+            raise
+        self.client.logger.info(f"Saved checkpoints of {len(batch)} wikis.")
+
+    async def run(self):
+        """Flushes checkpoints until cancelled"""
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+            try:
+                await self.flush()
+            except Exception:
+                self.client.logger.exception("Error while saving checkpoints")
@@ -1,16 +1,30 @@
 import asyncio
+import contextlib
+import json
 import logging
 import signal
+import time
 import datetime
 from collections import namedtuple
 import typing
-from typing import List, TYPE_CHECKING, Optional
+from typing import AsyncIterator, List, TYPE_CHECKING, Optional
 
-import aiohttp
 import asyncpg
 import fluent.runtime
 from core.entry import ActionType
 
+from core.checkpoints import Checkpoint, CheckpointWriter
+from core.fetch import FetchPool
+from core.http import NOT_MODIFIED, make_session
+from core.metrics import Metrics
+from core.pipeline import Pipeline
+from core.profiling import Profiler
+from core.recording import Recorder
+from core.resilience import RetryPolicy
+from core.scheduler import Scheduler
+from core.sharding import ShardCoordinator
+from fandom.account import Account
+from fandom.siteinfo import SiteInfo
 from fandom.wiki import Wiki 
 from handlers.discussions import DiscussionsHandler
 from handlers.rc import RCHandler
@@ -19,25 +33,105 @@ if TYPE_CHECKING:
     from core.entry import Entry
 
 __version__ = "0.0.1"
+USERS_PER_REQUEST = 50  # the limit of list=users for accounts without apihighlimits
+SITEINFO_CONCURRENCY = 4    # siteinfo is refreshed at low priority, so it never takes many fetch slots
+DELIVERY_CHUNK_SIZE = 500   # entries of a long burst are delivered in chunks of about this size, instead of being kept until its end
+MAX_RC_PAGES = 20           # pages of recent changes handled per cycle, the rest of a burst is left for the next cycles
+
+WIKIS_QUERY = """SELECT wikis.id, wikis.url, wikis.last_check_time, wikis.last_rcid, wikis.last_logid, wikis.rc_resume_time, array_agg(transports.type) as ttypes, array_agg(transports.url) as turls, array_agg(transports.actions) as tactions,
+                        (SELECT json_build_object(
+                            'sitename', sitename, 'namespaces', namespaces, 'article_path', article_path,
+                            'favicon', favicon, 'updated_at', extract(epoch from updated_at)
+                        ) FROM siteinfo WHERE siteinfo.wiki_id = wikis.id) as siteinfo
+                 FROM wikis, transports
+                 WHERE wikis.id = transports.wiki_id {condition}
+                 GROUP BY id;"""
 
 
 class RCData(typing.NamedTuple):
+    # rc, activity and posts are NOT_MODIFIED if they didn't change since the previous poll
     wiki: Wiki
-    rc: dict | BaseException
-    activity: list | BaseException
+    rc: dict | BaseException | None             # the first page of recent changes
+    activity: list | BaseException | None
     posts: dict | BaseException | None
+    prev_time: Optional[datetime.datetime]      # the window which was fetched, from prev_time to time
+    time: datetime.datetime
+    rc_pages: AsyncIterator[dict] | None = None # the rest of recent changes, fetched as they are handled
 
 class Venus:
     """Recent changes logger."""
 
-    def __init__(self, *, username: str = "Unkhown Fandom User", log_level: int = logging.INFO):
+    def __init__(
+        self,
+        *,
+        username: str = "Unkhown Fandom User",
+        log_level: int = logging.INFO,
+        min_interval: float = 10,
+        max_interval: float = 300,
+        fetch_limit: int = 100,
+        fetch_host_limit: int = 4,
+        max_in_flight: int = 1,
+        checkpoint_interval: float = 5,
+        workers: int = 1,
+        rebalance_interval: float = 30,
+        metrics_port: Optional[int] = None,
+        metrics_per_wiki: bool = False,
+        admin_port: Optional[int] = None,
+        record_directory: Optional[str] = None,
+        profile_directory: str = "profiles",
+        profile_cycles: int = 10,
+        profile_continuous: bool = False,
+        user_cache_size: int = 5000,
+        user_cache_ttl: float = 86400,
+        persist_user_ids: bool = False,
+        siteinfo_ttl: float = 86400,
+        siteinfo_interval: float = 300,
+        retries: int = 2,
+        keepalive_timeout: float = 30,
+        dns_ttl: int = 300,
+        discord_connections: int = 50,
+        stats_interval: float = 60
+    ):
         self.loop = asyncio.get_event_loop()
-        self.session = aiohttp.ClientSession(headers={
-            "User-Agent": f"Venus v{__version__} written by Black Spaceship, running by {username}"
-        })
-        self.pool: asyncpg.Pool = self.loop.run_until_complete(asyncpg.create_pool())  # type: ignore
-        self.wikis = []
+        self.metrics = Metrics(self, per_wiki=metrics_per_wiki)
+        user_agent = f"Venus v{__version__} written by Black Spaceship, running by {username}"
+        # wikis and webhooks get separate connection pools, so a slow Discord never takes connections from wikis
+        self.session = make_session(
+            "fandom", self.metrics,
+            limit=fetch_limit, limit_per_host=fetch_host_limit, keepalive_timeout=keepalive_timeout, dns_ttl=dns_ttl,
+            headers={"User-Agent": user_agent}
+        )
+        self.discord_session = make_session(
+            "discord", self.metrics,
+            limit=discord_connections, keepalive_timeout=keepalive_timeout, dns_ttl=dns_ttl,
+            headers={"User-Agent": user_agent}
+        )
+        self.pool: asyncpg.Pool = None  # type: ignore  # created upon run
+        self.wikis: dict[int, Wiki] = {}
         self.tasks = []
+        self.scheduler = Scheduler(min_interval=min_interval, max_interval=max_interval)
+        self.fetch_pool = FetchPool(limit=fetch_limit, per_host_limit=fetch_host_limit)
+        self.pipelines: dict[int, Pipeline] = {}
+        self.checkpoints = CheckpointWriter(self, interval=checkpoint_interval)
+        self.max_in_flight = max_in_flight
+        self.shard = ShardCoordinator(self, expected_workers=workers)
+        self.rebalance_interval = rebalance_interval
+        self.listener: Optional[asyncpg.Connection] = None
+        self.config_changes: asyncio.Queue[int] = asyncio.Queue()
+        self.metrics_port = metrics_port
+        self.admin_port = admin_port
+        self.recorder = Recorder(record_directory) if record_directory else None
+        self.stats_interval = stats_interval
+        self.profiler = Profiler(self, directory=profile_directory, cycles=profile_cycles)
+        self.profile_continuous = profile_continuous
+        self.loop.set_task_factory(self.profiler.task_factory)
+        self.user_cache_size = user_cache_size
+        self.user_cache_ttl = user_cache_ttl
+        self.persist_user_ids = persist_user_ids
+        self.siteinfo_ttl = siteinfo_ttl
+        self.siteinfo_interval = siteinfo_interval
+        self.siteinfo_wanted = asyncio.Event()
+        self.retry_policy = RetryPolicy(attempts=retries + 1)
 
         loader = fluent.runtime.FluentResourceLoader("strings/{locale}")
         self.l10n = fluent.runtime.FluentLocalization(["ru"], ["main.ftl"], loader)
@@ -48,147 +142,599 @@ class Venus:
         handler.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s: %(message)s'))
         self.logger.addHandler(handler)
 
+    @contextlib.asynccontextmanager
+    async def acquire(self) -> AsyncIterator[asyncpg.Connection]:
+        """Acquires a connection from the pool, recording how long it took"""
+        start = time.perf_counter()
+        async with self.pool.acquire() as conn:
+            self.metrics.pool_acquire_wait.observe(time.perf_counter() - start)
+            yield conn
+
     async def load(self):
         """Loads list of wikis and transports from database"""
-        async with self.pool.acquire() as conn:
-            wikis = await conn.fetch("""SELECT wikis.id, wikis.url, wikis.last_check_time, array_agg(transports.type) as ttypes, array_agg(transports.url) as turls, array_agg(transports.actions) as tactions
-                                        FROM wikis, transports
-                                        WHERE wikis.id = transports.wiki_id
-                                        GROUP BY id;""")
+        async with self.acquire() as conn:
+            wikis = await conn.fetch(WIKIS_QUERY.format(condition=""))
             self.logger.debug("Wiki list was sucsessfully fetched. Handling...")
             for row in wikis:
-                wiki = Wiki(row["id"], row["url"], row["last_check_time"], self)
-                for transport_type, transport_url, transport_action in zip(row["ttypes"], row["turls"], row["tactions"]):
-                    wiki.add_transport(transport_type, transport_url, transport_action)
+                wiki = self.load_wiki(row)
                 self.logger.debug(f"{row['id']} was processed")
-                self.wikis.append(wiki)
-            else:
+                self.wikis[wiki.id] = wiki
+            if not wikis:
                 self.logger.warn("There weren't any wikis in db. Please add one with 'python -m venus add-wiki'.")
+
+    def load_wiki(self, row) -> Wiki:
+        """Creates a wiki from a database row"""
+        wiki = Wiki(row["id"], row["url"], row["last_check_time"], self)
+        wiki.last_rcid, wiki.last_logid, wiki.rc_resume_time = row["last_rcid"], row["last_logid"], row["rc_resume_time"]
+        if row["siteinfo"] is not None:
+            wiki.set_siteinfo(SiteInfo.from_json(row["siteinfo"]))
+        self.load_transports(wiki, row)
+        return wiki
+
+    def load_transports(self, wiki: Wiki, row):
+        """Replaces wiki transports with the ones from a database row"""
+        wiki.transports.clear()
+        for transport_type, transport_url, transport_action in zip(row["ttypes"], row["turls"], row["tactions"]):
+            wiki.add_transport(transport_type, transport_url, transport_action)
+
+    async def reload_wiki(self, wiki_id: int):
+        """Applies changes of a single wiki and its transports from database"""
+        async with self.acquire() as conn:
+            row = await conn.fetchrow(WIKIS_QUERY.format(condition="AND wikis.id = $1"), wiki_id)
+
+        wiki = self.wikis.get(wiki_id)
+        if row is None:
+            if wiki is not None:
+                # the wiki was deleted or has no transports left
+                self.stop_polling(wiki)
+                del self.wikis[wiki_id]
+                await self.shard.release([wiki_id])
+                self.logger.info(f"Removed wiki {wiki.url}.")
+        elif wiki is None:
+            wiki = self.load_wiki(row)
+            self.wikis[wiki_id] = wiki
+            self.logger.info(f"Added wiki {wiki.url}.")
+            await self.rebalance()
+        else:
+            if wiki.url != row["url"]:
+                wiki.url = row["url"]
+                wiki.set_siteinfo(None)
+                async with self.acquire() as conn:
+                    await conn.execute("DELETE FROM siteinfo WHERE wiki_id = $1", wiki_id)
+                self.siteinfo_wanted.set()
+            self.load_transports(wiki, row)
+            self.logger.info(f"Updated wiki {wiki.url}, it has {len(wiki.transports)} transports now.")
+
+    def on_config_change(self, conn, pid, channel, payload):
+        self.config_changes.put_nowait(json.loads(payload)["id"])
+
+    async def listen(self):
+        """Listens for changes of wikis and transports and queues them to be applied"""
+        reconnecting = False
+        while True:
+            lost = asyncio.Event()
+            try:
+                self.listener = await asyncpg.connect()
+                self.listener.add_termination_listener(lambda conn: lost.set())
+                await self.listener.add_listener("venus_config", self.on_config_change)
+
+                if reconnecting:
+                    # changes made while we were disconnected are lost, so every wiki has to be checked
+                    async with self.acquire() as conn:
+                        wiki_ids = {row["id"] for row in await conn.fetch("SELECT id FROM wikis")}
+                    for wiki_id in wiki_ids | self.wikis.keys():
+                        self.config_changes.put_nowait(wiki_id)
+            except Exception:
+                self.logger.exception("Couldn't listen for config changes, retrying later")
+                if self.listener is not None:
+                    self.listener.terminate()
+                await asyncio.sleep(self.rebalance_interval)
+            else:
+                await lost.wait()
+                self.logger.error("Lost connection while listening for config changes, reconnecting...")
+            reconnecting = True
+
+    async def apply_config_changes(self):
+        while True:
+            wiki_id = await self.config_changes.get()
+            try:
+                await self.reload_wiki(wiki_id)
+            except Exception:
+                self.logger.exception(f"Error while reloading wiki {wiki_id}")
+
+    async def start_polling(self, wiki_ids: List[int]):
+        """Starts polling wikis which were claimed by this worker"""
+        async with self.acquire() as conn:
+            # the wikis might have been polled by another worker before
+            rows = await conn.fetch("SELECT id, last_check_time, last_rcid, last_logid, rc_resume_time FROM wikis WHERE id = any($1::integer[])", wiki_ids)
+        for row in rows:
+            wiki = self.wikis[row["id"]]
+            wiki.last_check_time = wiki.prev_check_time = row["last_check_time"]
+            wiki.last_rcid, wiki.last_logid, wiki.rc_resume_time = row["last_rcid"], row["last_logid"], row["rc_resume_time"]
+            self.schedule_wiki(wiki)
+
+    def schedule_wiki(self, wiki: Wiki):
+        self.pipelines[wiki.id] = Pipeline(self, wiki, max_in_flight=self.max_in_flight)
+        self.scheduler.add(wiki)
+        if wiki.siteinfo is None:
+            self.siteinfo_wanted.set()
+
+    async def update_siteinfo(self, wiki: Wiki):
+        """Fetches wiki metadata and saves it to database"""
+        try:
+            siteinfo = await wiki.fetch_siteinfo()
+        except Exception as e:
+            self.logger.warning(f"Exception occured while requesting siteinfo of {wiki.url}: {e!r}")
+            return
+
+        wiki.set_siteinfo(siteinfo)
+        async with self.acquire() as conn:
+            await conn.execute(
+                """INSERT INTO siteinfo (wiki_id, sitename, namespaces, article_path, favicon, updated_at)
+                   VALUES ($1, $2, $3::jsonb, $4, $5, $6)
+                   ON CONFLICT (wiki_id) DO UPDATE SET
+                       sitename = excluded.sitename, namespaces = excluded.namespaces, article_path = excluded.article_path,
+                       favicon = excluded.favicon, updated_at = excluded.updated_at""",
+                wiki.id,
+                siteinfo.sitename,
+                json.dumps(siteinfo.namespaces),
+                siteinfo.article_path,
+                siteinfo.favicon,
+                siteinfo.updated_at
+            )
+
+    async def refresh_siteinfo(self):
+        """Keeps metadata of polled wikis fresh, so requests for recent changes never have to carry siteinfo"""
+        while True:
+            try:
+                await asyncio.wait_for(self.siteinfo_wanted.wait(), self.siteinfo_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.siteinfo_wanted.clear()
+
+            expired = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.siteinfo_ttl)
+            stale = [
+                wiki for wiki in (self.wikis.get(wiki_id) for wiki_id in list(self.pipelines))
+                if wiki is not None and not wiki.breaker.open and (wiki.siteinfo is None or wiki.siteinfo.updated_at < expired)
+            ]
+            # wikis which don't have a name yet go first
+            stale.sort(key=lambda wiki: wiki.siteinfo is not None)
+            for i in range(0, len(stale), SITEINFO_CONCURRENCY):
+                results = await asyncio.gather(*(self.update_siteinfo(wiki) for wiki in stale[i:i + SITEINFO_CONCURRENCY]), return_exceptions=True)
+                for result in results:
+                    if isinstance(result, Exception):
+                        self.logger.error(f"Error while saving siteinfo: {result!r}")
+
+    def stop_polling(self, wiki: Wiki):
+        """Stops polling a wiki. Its undelivered cycles are dropped"""
+        self.scheduler.remove(wiki)
+        pipeline = self.pipelines.pop(wiki.id, None)
+        if pipeline is not None:
+            pipeline.close()
+
+    async def rebalance(self):
+        """Claims or releases wikis, so every worker owns an equal share of them"""
+        if not self.shard.connected:
+            for wiki_id in list(self.pipelines):
+                self.stop_polling(self.wikis[wiki_id])
+            await self.shard.connect()
+
+        share = await self.shard.share(len(self.wikis))
+        owned = len(self.shard.owned)
+        if owned < share:
+            claimed = await self.shard.claim(self.wikis.keys(), share - owned)
+            if claimed:
+                await self.start_polling(claimed)
+                self.logger.info(f"Claimed {len(claimed)} wikis, now polling {len(self.shard.owned)}.")
+        elif owned > share:
+            # only wikis which are neither being fetched nor delivered can be handed over safely
+            to_release = [
+                self.wikis[wiki_id] for wiki_id, pipeline in self.pipelines.items()
+                if self.wikis[wiki_id] in self.scheduler and not pipeline.backlog
+            ][:owned - share]
+            for wiki in to_release:
+                self.stop_polling(wiki)
+
+            # the next owner must see the latest checkpoints
+            try:
+                await self.checkpoints.flush()
+            except Exception:
+                self.logger.exception("Error while saving checkpoints, keeping wikis")
+                for wiki in to_release:
+                    self.schedule_wiki(wiki)
+                return
+            await self.shard.release(wiki.id for wiki in to_release)
+            self.logger.info(f"Released {len(to_release)} wikis, now polling {len(self.shard.owned)}.")
+
+    async def keep_balanced(self):
+        """Periodically rebalances wikis between workers"""
+        while True:
+            await asyncio.sleep(self.rebalance_interval)
+            try:
+                await self.rebalance()
+            except Exception:
+                self.logger.exception("Error while rebalancing wikis")
     
     async def fetch_data(self, wiki: Wiki) -> RCData:
-        """Fetches RC data for a given wiki"""
-        
-        # TODO: Make this fetch only required data
+        """Fetches RC data for a given wiki. Only data some of wiki transports subscribe to is requested"""
+        plan = wiki.fetch_plan
         wiki.prev_check_time = wiki.last_check_time
         wiki.last_check_time = datetime.datetime.utcnow()
+        if self.recorder is not None:
+            self.recorder.start_cycle(wiki)
         
-        self.logger.debug(f"Making query for wiki {wiki.url} with last_check_time={wiki.prev_check_time}")
-        rc_data, activity_data, posts_data = await asyncio.gather(
-            wiki.fetch_rc(
-                types=["edit", "new", "categorze"],
-                recent_changes_props=["user", "userid", "ids", "sizes", "flags", "title", "timestamp", "comment"],
-                logevents_props=["user", "userid", "ids", "type", "title", "timestamp", "comment", "details"],
-                limit="max",
-                after=wiki.prev_check_time,
-                before=wiki.last_check_time
-            ),
-            wiki.fetch_social_activity(
-                after=wiki.prev_check_time
-            ),
-            wiki.fetch_recent_posts(),
-            return_exceptions=True
+        self.logger.debug(f"Making query for wiki {wiki.url} with last_check_time={wiki.prev_check_time} and {plan}")
+        rc_data = rc_pages = activity_data = posts_data = None
+        if plan.rc and plan.discussions:
+            rc_data, discussions_data = await asyncio.gather(
+                self.fetch_rc_data(wiki),
+                self.fetch_discussions_data(wiki),
+                return_exceptions=True
+            )
+            if isinstance(discussions_data, BaseException):
+                activity_data = discussions_data
+            else:
+                activity_data, posts_data = discussions_data
+        elif plan.rc:
+            rc_data, = await asyncio.gather(self.fetch_rc_data(wiki), return_exceptions=True)
+        elif plan.discussions:
+            activity_data, posts_data = await self.fetch_discussions_data(wiki)
+
+        if isinstance(rc_data, tuple):
+            rc_data, rc_pages = rc_data
+        return RCData(wiki=wiki, rc=rc_data, activity=activity_data, posts=posts_data, prev_time=wiki.prev_check_time, time=wiki.last_check_time, rc_pages=rc_pages)
+
+    async def fetch_rc_data(self, wiki: Wiki) -> tuple[dict, AsyncIterator[dict]]:
+        """Fetches the first page of recent changes. Returns it along with the iterator over the other pages"""
+        plan = wiki.fetch_plan
+        # the rest of a burst which wasn't handled whole goes first
+        after = wiki.rc_resume_time or wiki.prev_check_time
+        pages = wiki.fetch_rc(
+            types=plan.recent_changes_types,
+            recent_changes_props=plan.recent_changes_props,
+            logevents_props=plan.logevents_props,
+            limit="max",
+            # oldest rows first, so a burst can be delivered in order as it's paged through.
+            # there is no upper bound, rows which were already handled are skipped by their ids
+            after=after,
+            newer=after is not None
         )
-        return RCData(wiki=wiki, rc=rc_data, activity=activity_data, posts=posts_data)
+        first_page = await anext(pages)
+        if first_page is NOT_MODIFIED or after is None:
+            # without a check time there is no window to catch up on, only the newest rows are handled
+            await pages.aclose()
+            return first_page, None
+        return first_page, pages
+
+    async def fetch_discussions_data(self, wiki: Wiki) -> tuple[list | BaseException, dict | BaseException | None]:
+        """Fetches social activity and, if there was any, the list of recent posts"""
+        try:
+            activity_data = await wiki.fetch_social_activity(after=wiki.prev_check_time)
+            if activity_data is NOT_MODIFIED or not any(day["actions"] for day in activity_data):
+                return activity_data, None
+        except Exception as e:
+            return e, None
+
+        try:
+            posts_data = await wiki.fetch_recent_posts()
+        except Exception as e:
+            return activity_data, e
+        return activity_data, posts_data
 
     async def populate_ids(self, wiki: Wiki, entries: List["Entry"]):
-        authors_and_ids = {}
+        """Fills in ids of accounts which only have a name, using the wiki's cache of user ids where possible"""
+        cache = wiki.user_ids
+
+        accounts: List[Account] = []
         for entry in entries:
-            authors_and_ids[entry.user.name] = entry.user.id
-        
-        to_query = [k.replace(" ", "_") for k, v in authors_and_ids.items() if v == 0]
-        if not to_query:
-            return
+            for account in (entry.user, entry.target):
+                if not isinstance(account, Account):
+                    continue
+                if account.id:
+                    cache.set(account.name, account.id)
+                else:
+                    accounts.append(account)
+
+        missing = {account.name for account in accounts if cache.get(account.name) is None}
+        self.metrics.user_id_lookups.inc(len(accounts) - len(missing), source="cache")
+        if missing and self.persist_user_ids:
+            try:
+                stored = await self.load_user_ids(wiki, missing)
+            except Exception:
+                self.logger.exception(f"Error while loading user ids of wiki {wiki.url}")
+            else:
+                for name, user_id in stored.items():
+                    cache.set(name, user_id)
+                missing.difference_update(stored)
+                self.metrics.user_id_lookups.inc(len(stored), source="database")
+
+        if self.recorder is not None:
+            # ids which weren't requested from api, replay can't request them either
+            known = {name: cache.get(name) for name in {account.name for account in accounts} - missing}
+            self.recorder.record_user_ids(wiki, {name: user_id for name, user_id in known.items() if user_id is not None})
+
+        if missing:
+            fetched = await self.fetch_user_ids(wiki, missing)
+            for name, user_id in fetched.items():
+                cache.set(name, user_id)
+            self.metrics.user_id_lookups.inc(len(fetched), source="api")
+            if fetched and self.persist_user_ids:
+                try:
+                    await self.save_user_ids(wiki, fetched)
+                except Exception:
+                    self.logger.exception(f"Error while saving user ids of wiki {wiki.url}")
+
+        for account in accounts:
+            # ids which couldn't be fetched stay 0, they will be requested again next time
+            account.id = cache.get(account.name) or 0
 
-        result = await wiki.query_mw(
-            params=dict(
+    async def fetch_user_ids(self, wiki: Wiki, names: typing.Iterable[str]) -> dict[str, int]:
+        """Requests ids of users from api, in concurrent requests of at most USERS_PER_REQUEST names.
+        Names which aren't registered accounts, like ip addresses, get id 0"""
+        names = sorted(names)
+        chunks = [names[i:i + USERS_PER_REQUEST] for i in range(0, len(names), USERS_PER_REQUEST)]
+        results = await asyncio.gather(*(
+            wiki.query_mw(params=dict(
                 action="query",
                 list="users",
-                ususers="|".join(to_query),
+                ususers="|".join(name.replace(" ", "_") for name in chunk),
                 format="json"
+            ), record=True)
+            for chunk in chunks
+        ), return_exceptions=True)
+
+        ids: dict[str, int] = {}
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, BaseException):
+                self.logger.error(f"Exception occured while requesting user ids in {wiki.url}: {result!r}")
+                continue
+            for user in result["query"]["users"]:
+                ids[user["name"]] = user.get("userid", 0)
+            for name in chunk:
+                ids.setdefault(name, 0)
+        return ids
+
+    async def load_user_ids(self, wiki: Wiki, names: typing.Iterable[str]) -> dict[str, int]:
+        """Loads ids of users saved to database less than user_cache_ttl seconds ago"""
+        async with self.acquire() as conn:
+            rows = await conn.fetch(
+                """SELECT name, user_id FROM user_ids
+                   WHERE wiki_id = $1 AND name = ANY($2::text[])
+                   AND updated_at > (now() AT TIME ZONE 'utc') - make_interval(secs => $3)""",
+                wiki.id,
+                list(names),
+                self.user_cache_ttl
             )
-        )
+        return {row["name"]: row["user_id"] for row in rows}
 
-        for user in result["query"]["users"]:
-            authors_and_ids[user["name"]] = user["userid"]
-        for entry in entries:
-            entry.user.id = authors_and_ids[entry.user.name]
+    async def save_user_ids(self, wiki: Wiki, ids: dict[str, int]):
+        """Saves ids of users to database, so they survive restarts"""
+        async with self.acquire() as conn:
+            await conn.execute(
+                """INSERT INTO user_ids (wiki_id, name, user_id, updated_at)
+                   SELECT $1, users.name, users.user_id, now() AT TIME ZONE 'utc'
+                   FROM unnest($2::text[], $3::integer[]) AS users(name, user_id)
+                   ON CONFLICT (wiki_id, name) DO UPDATE SET user_id = excluded.user_id, updated_at = excluded.updated_at""",
+                wiki.id,
+                list(ids.keys()),
+                list(ids.values())
+            )
 
     async def main(self):
-        """Main loop function. Polls and processes recent changes every n minutes"""
+        """Main loop function. Polls every wiki once it becomes due"""
+        if not self.wikis:
+            self.logger.warn("There aren't any wikis in db, so there is nothing to poll.")
+
         while True:
-            if not self.wikis:
-                self.logger.warn("There aren't any wikis in db so we're skipping this iteration. We'll retry again in 10 seconds...")
+            for wiki in await self.scheduler.due():
+                self.loop.create_task(self.poll(wiki))
+
+    def check_data(self, data: RCData) -> Optional[RCData]:
+        """Logs failed requests and replaces their results with None. Returns None if every request failed.
+        Results which are NOT_MODIFIED are kept, they are falsy and skipped by handlers like empty ones"""
+        rc_data, activity_data, posts_data = data.rc, data.activity, data.posts
+        if isinstance(rc_data, Exception):
+            self.logger.error(f"Exception occured while requesting data for recent changes in {data.wiki.url}: {rc_data!r}")
+            rc_data = None
+
+        if isinstance(activity_data, Exception):
+            self.logger.error(f"Exception occured while requesting social activity in {data.wiki.url}: {activity_data!r}")
+            activity_data = None
+
+        if isinstance(posts_data, Exception):
+            self.logger.error(f"Exception occured while requesting data for posts in {data.wiki.url}: {posts_data!r}")
+            posts_data = None
+
+        results = [result for result in (data.rc, data.activity) if result is not None]
+        if results and all(isinstance(result, Exception) for result in results):
+            return None
+        return data._replace(rc=rc_data, activity=activity_data, posts=posts_data)
+
+    def count_entries(self, data: RCData) -> int:
+        """Returns how many entries were fetched. Only the first page of recent changes is counted"""
+        entries = 0
+        if data.rc:
+            query = data.rc.get("query", {})
+            entries += len(query.get("recentchanges", [])) + len(query.get("logevents", []))
+        if data.activity:
+            entries += sum(len(day["actions"]) for day in data.activity)
+        return entries
+
+    async def poll(self, wiki: Wiki):
+        """Polls a single wiki and schedules its next poll"""
+        pipeline = self.pipelines.get(wiki.id)
+        if pipeline is None:
+            # the wiki was released while waiting for its turn
+            return
+        if pipeline.busy:
+            # check times are left as is, so the next poll covers the skipped window too
+            pipeline.skipped += 1
+            self.logger.warning(f"Wiki {wiki.url} still has {pipeline.backlog} cycle(s) in flight, skipping this poll.")
+            self.scheduler.schedule(wiki, wiki.poll_interval)
+            return
+
+        entries = 0
+        failed = False
+        try:
+            self.logger.info(f"Polling {wiki.url}...")
+            with self.profiler.stage(wiki.url, "fetch"):
+                data = self.check_data(await self.fetch_data(wiki))
+            if data is None:
+                failed = True
+                self.logger.error(f"All requests returned an exception, skipping wiki {wiki.url}.")
+                # nothing was received, so the next poll has to cover this window too
+                wiki.last_check_time = wiki.prev_check_time
+                if wiki.breaker.record_failure():
+                    self.logger.warning(f"Wiki {wiki.url} failed {wiki.breaker.failures} polls in a row, polling it less often.")
+                self.profiler.cycle_done()
+                if self.recorder is not None:
+                    self.recorder.discard_cycle(wiki)
             else:
-                self.logger.info("Polling...")
-                tasks = [self.fetch_data(wiki) for wiki in self.wikis]
-                for task in asyncio.as_completed(tasks):
-                    data = await task
-                    now = data.wiki.last_check_time
-                    
-                    if isinstance(data.rc, Exception):
-                        self.logger.error(f"Exception occured while requesting data for recent changes in {data.wiki.url}: {data.rc!r}")
-                        rc_data = None
-                    else:
-                        rc_data = data.rc
-
-                    if isinstance(data.activity, Exception):
-                        self.logger.error(f"Exception occured while requesting social activity in {data.wiki.url}: {data.activity!r}")
-                        activity_data = None
-                    else:
-                        activity_data = data.activity
-
-                    if isinstance(data.posts, Exception):
-                        self.logger.error(f"Exception occured while requesting data for posts in {data.wiki.url}: {data.activity!r}")
-                        posts_data = None
-                    else:
-                        posts_data = data.posts
-
-                    if rc_data or activity_data:
-                        self.logger.info(f"Ready for {data.wiki.url}, now handling...")
-                        self.loop.create_task(self.handle(data.wiki, rc_data, activity_data, posts_data, time=now))
-                    else:
-                        self.logger.error(f"Both requests returned an exception, skipping wiki {data.wiki.url}.")
-
-            await asyncio.sleep(10)
-
-    async def handle(self, wiki: Wiki, rc_data, activity_data, posts_data, time):
+                wiki.breaker.record_success()
+                entries = self.count_entries(data)
+                self.logger.info(f"Ready for {data.wiki.url}, now handling...")
+                await pipeline.submit(data)
+        finally:
+            if wiki.id in self.shard.owned:
+                self.schedule_next_poll(wiki, entries, failed)
+
+    def schedule_next_poll(self, wiki: Wiki, entries: int, failed: bool):
+        """Schedules the next poll of a wiki after a poll which returned `entries` entries"""
+        if failed:
+            # failures say nothing about the entry rate, only the breaker may slow polling down
+            delay = max(wiki.poll_interval, wiki.breaker.cooldown) if wiki.breaker.open else wiki.poll_interval
+            self.scheduler.schedule(wiki, delay)
+        else:
+            if wiki.prev_check_time:
+                elapsed = (wiki.last_check_time - wiki.prev_check_time).total_seconds()
+            else:
+                elapsed = 0
+            self.scheduler.reschedule(wiki, entries, elapsed)
+            delay = wiki.poll_interval
+        self.logger.debug(f"Next poll for {wiki.url} in {delay:.1f} seconds")
+
+    async def report_stats(self):
+        """Periodically logs request statistics"""
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            self.logger.info(f"Fetch stats for the last {self.stats_interval:.0f} seconds: {self.fetch_pool.stats}")
+            self.fetch_pool.stats.reset()
+            for session in ("fandom", "discord"):
+                created = self.metrics.http_connections.get(session=session, event="created")
+                reused = self.metrics.http_connections.get(session=session, event="reused")
+                if created or reused:
+                    self.logger.info(f"HTTP connections to {session} since start: {created:.0f} created, {reused:.0f} reused ({reused / (created + reused):.0%}).")
+
+            backlog = [
+                f"{pipeline.wiki.url}: {pipeline.backlog} in flight, {pipeline.skipped} skipped"
+                for pipeline in self.pipelines.values()
+                if pipeline.backlog or pipeline.skipped
+            ]
+            if backlog:
+                self.logger.info("Wikis with backlog:\n" + "\n".join(backlog))
+            for pipeline in self.pipelines.values():
+                pipeline.skipped = 0
+
+    async def prepare_chunk(self, wiki: Wiki, chunk: List["Entry"]) -> List["Entry"]:
+        """Fills in account ids of handled entries and orders them by time"""
+        with self.profiler.stage(wiki.url, "populate_ids"):
+            await self.populate_ids(wiki, chunk)
+        chunk.sort(key=lambda e: e.timestamp)
+        return chunk
+
+    async def handle(self, data: RCData) -> AsyncIterator[tuple[List["Entry"], Optional[Checkpoint]]]:
+        """Turns fetched data into entries, yielded in chunks ordered by time.
+
+        Long bursts of recent changes are yielded as their pages are handled, so a whole burst is never kept
+        in memory. Only the last chunk has a checkpoint, and at most MAX_RC_PAGES pages are handled:
+        the wiki's `rc_resume_time` is then set to the newest handled row, and the next cycle carries on from it.
+        """
+        wiki, rc_data, activity_data, posts_data = data.wiki, data.rc, data.activity, data.posts
         handled_data: List[Entry] = []
+        total = 0
+        rc_resume_time = wiki.rc_resume_time    # kept if recent changes weren't handled
         if rc_data:
             self.logger.info(f"Processing RC for wiki {wiki.url}...")
-            self.logger.debug(f"Recieved {rc_data}")
+            self.logger.debug("Recieved %s", rc_data)
             
             rc_handler = RCHandler(self, wiki)
-            handled_data.extend(rc_handler.handle(rc_data))
+            rc_resume_time = None
+            with self.profiler.stage(wiki.url, "RCHandler"), self.metrics.handler_cpu.time(wiki.url, clock=time.process_time, handler="rc"):
+                handled_data.extend(rc_handler.handle(rc_data))
+
+            if data.rc_pages is not None:
+                handled_page, pages_handled = rc_data, 1
+                async with contextlib.aclosing(data.rc_pages) as pages:
+                    try:
+                        while pages_handled < MAX_RC_PAGES:
+                            with self.profiler.stage(wiki.url, "fetch"):
+                                page = await anext(pages, None)
+                            if page is None:
+                                break
+                            self.logger.debug("Recieved next page of RC for wiki %s: %s", wiki.url, page)
+                            if len(handled_data) >= DELIVERY_CHUNK_SIZE:
+                                total += len(handled_data)
+                                yield await self.prepare_chunk(wiki, handled_data), None
+                                handled_data = []
+                            with self.profiler.stage(wiki.url, "RCHandler"), self.metrics.handler_cpu.time(wiki.url, clock=time.process_time, handler="rc"):
+                                handled_data.extend(rc_handler.handle(page))
+                            handled_page, pages_handled = page, pages_handled + 1
+                        else:
+                            rc_resume_time = rc_handler.resume_time(handled_page)
+                            if rc_resume_time is not None:
+                                self.logger.warning(f"Handled {MAX_RC_PAGES} pages of recent changes in {wiki.url}, the rest is left for the next cycle.")
+                    except Exception as e:
+                        self.logger.error(f"Exception occured while requesting more recent changes in {wiki.url}: {e!r}")
+                        # the rest of the burst is requested again by the next cycle
+                        rc_resume_time = rc_handler.resume_time(handled_page)
+            # only recent changes are resumed, the window of discussions moves on
+            wiki.last_rcid, wiki.last_logid, wiki.rc_resume_time = rc_handler.last_rcid, rc_handler.last_logid, rc_resume_time
 
         if activity_data:
             self.logger.info(f"Processing posts for wiki {wiki.url}...")
-            self.logger.debug(f"Recieved {activity_data}")
+            self.logger.debug("Recieved %s", activity_data)
 
-            discussions_handler = DiscussionsHandler(self, wiki)
-            handled_data.extend(discussions_handler.handle(activity_data, posts_data))
+            discussions_handler = DiscussionsHandler(self, wiki, since=data.prev_time)
+            with self.profiler.stage(wiki.url, "DiscussionsHandler"), self.metrics.handler_cpu.time(wiki.url, clock=time.process_time, handler="discussions"):
+                handled_data.extend(discussions_handler.handle(activity_data, posts_data))
         
-        await self.populate_ids(wiki, handled_data)
-        handled_data.sort(key=lambda e: e.timestamp)
+        await self.prepare_chunk(wiki, handled_data)
+        total += len(handled_data)
         self.logger.info(f"Done processing for wiki {wiki.url}.")
         self.logger.info(f"Data after processing: {handled_data!r}.")
-        
+        self.metrics.entries.observe(total, wiki.url)
+        if self.recorder is not None:
+            await self.recorder.finish_cycle(wiki)
+        yield handled_data, Checkpoint(data.time, wiki.last_rcid, wiki.last_logid, rc_resume_time)
+
+    async def deliver(self, wiki: Wiki, handled_data: List["Entry"], checkpoint: Optional[Checkpoint]):
+        """Sends entries to all wiki transports and queues wiki's checkpoint to be saved, if there is one"""
         self.logger.info(f"Sending data for wiki {wiki.url}...")
         self.logger.debug(wiki.transports)
         tasks = [transport.execute(handled_data) for transport in wiki.transports]
         
-        await asyncio.gather(*tasks)
+        with self.profiler.stage(wiki.url, "transport send"):
+            await asyncio.gather(*tasks)
         
-        async with self.pool.acquire() as conn:
-            await conn.execute("UPDATE wikis SET last_check_time = $1 WHERE id = $2", time, wiki.id)
-            self.logger.info(f"Updated last_check_time for wiki {wiki.url}.")
+        # the checkpoint is queued only after all transports are done
+        if checkpoint is not None:
+            self.checkpoints.add(wiki.id, checkpoint)
 
     async def cleanup(self, signal):
         """Cleans up all tasks after logger shutdown"""
         self.logger.info(f"Receivied exit signal {signal}. Exiting...")
+        self.logger.info("Saving checkpoints...")
+        try:
+            await self.checkpoints.flush()
+        except Exception:
+            self.logger.exception("Error while saving checkpoints")
+        self.logger.info("Releasing wikis...")
+        await self.shard.close()
         self.logger.info("Closing connection pool...")
         await self.pool.close()
-        self.logger.info("Closing client session...")
+        self.logger.info("Closing client sessions...")
         await self.session.close()
+        await self.discord_session.close()
 
         self.logger.info("Cleaning up all tasks...")
         tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
@@ -196,6 +742,8 @@ class Venus:
             t.cancel()
 
         await asyncio.gather(*tasks, return_exceptions=True)
+        if self.listener is not None:
+            self.listener.terminate()
 
         self.loop.stop()
 
@@ -204,10 +752,25 @@ class Venus:
         signals = (signal.SIGTERM, signal.SIGINT)
         for s in signals:
             self.loop.add_signal_handler(s, lambda s=s: asyncio.create_task(self.cleanup(s)))
+        self.loop.add_signal_handler(signal.SIGUSR1, lambda: asyncio.create_task(self.profiler.profile_cycles()))
         
+        self.pool = self.loop.run_until_complete(asyncpg.create_pool())  # type: ignore
         self.loop.run_until_complete(self.load())
+        self.loop.run_until_complete(self.rebalance())
+        if self.metrics_port is not None:
+            self.loop.run_until_complete(self.metrics.serve(self.metrics_port))
+        if self.admin_port is not None:
+            self.loop.run_until_complete(self.profiler.serve(self.admin_port))
         try:
             self.loop.create_task(self.main())
+            self.loop.create_task(self.report_stats())
+            self.loop.create_task(self.checkpoints.run())
+            self.loop.create_task(self.keep_balanced())
+            self.loop.create_task(self.listen())
+            self.loop.create_task(self.apply_config_changes())
+            self.loop.create_task(self.refresh_siteinfo())
+            if self.profile_continuous:
+                self.loop.create_task(self.profiler.run_continuous())
             self.loop.run_forever()
         finally:
             self.loop.close()
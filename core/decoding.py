@@ -0,0 +1,46 @@
+import functools
+import json
+from typing import Any, Optional
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# library used for responses without a schema
+BACKEND = "orjson" if orjson is not None else "msgspec" if msgspec is not None else "json"
+_ERRORS: tuple[type[Exception], ...] = (ValueError, msgspec.DecodeError) if msgspec is not None else (ValueError,)
+
+
+class DecodeError(ValueError):
+    """Raised when a response isn't valid JSON or doesn't match its schema"""
+    pass
+
+
+@functools.lru_cache
+def _decoder(schema: type) -> "msgspec.json.Decoder":
+    return msgspec.json.Decoder(schema)
+
+
+def decode(data: bytes | str, schema: Optional[type] = None) -> Any:
+    """Decodes JSON into dicts and lists.
+
+    If msgspec is installed and a TypedDict `schema` is given, the document is validated against it
+    while decoding, and keys the schema doesn't list are skipped instead of being built. Without msgspec
+    the schema is ignored and the fastest available library decodes the whole document.
+    """
+    try:
+        if schema is not None and msgspec is not None:
+            return _decoder(schema).decode(data)
+        if orjson is not None:
+            return orjson.loads(data)
+        if msgspec is not None:
+            return msgspec.json.decode(data)
+        return json.loads(data)
+    except _ERRORS as e:
+        raise DecodeError(str(e)) from e
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, fields
 from datetime import datetime
 import enum
 from typing import Any, Generic, Iterator, List, Optional, TypeVar, Union, TYPE_CHECKING
@@ -49,7 +49,7 @@ class Action(enum.Enum):
     edit_comment = 21
 
 
-@dataclass
+@dataclass(slots=True)
 class Diff(Generic[DiffT]):
     old: DiffT
     new: DiffT
@@ -60,7 +60,7 @@ EditParams = Diff["PageVersion"]
 
 
 # Rename log
-@dataclass
+@dataclass(slots=True)
 class RenameParams:
     diff: Diff[Page]
     suppress_redirect: bool
@@ -71,12 +71,12 @@ class ProtectionLevel(enum.Enum):
     autoconfirmed = "autoconfirmed"
     sysop = "sysop"
 
-@dataclass
+@dataclass(slots=True)
 class ProtectionData:
     level: ProtectionLevel
     expiry: Optional[datetime]
 
-@dataclass
+@dataclass(slots=True)
 class ProtectionParams:
     cascade: bool
 
@@ -87,14 +87,15 @@ class ProtectionParams:
     upload: Optional[ProtectionData] = None
 
     def __iter__(self) -> Iterator[tuple[str, ProtectionData]]:
-        for key, value in self.__dict__.items():
-            if key == "cascade":
+        for field in fields(self):
+            if field.name == "cascade":
                 continue
+            value = getattr(self, field.name)
             if value:
-                yield key, value
+                yield field.name, value
 
 # Block log
-@dataclass
+@dataclass(slots=True)
 class BlockParams:
     expiry: Optional[datetime]
     autoblock_disabled: bool
@@ -102,14 +103,15 @@ class BlockParams:
     cannot_create_accounts: bool
 
     def __iter__(self) -> Iterator[tuple[str, bool]]:
-        for key, value in self.__dict__.items():
-            if key == "expiry":
+        for field in fields(self):
+            if field.name == "expiry":
                 continue
+            value = getattr(self, field.name)
             if value:
-                yield key, value
+                yield field.name, value
 
 # Rights log
-@dataclass
+@dataclass(slots=True)
 class Group:
     name: str
     expiry: Optional[datetime]
@@ -120,7 +122,7 @@ class Group:
 RightsParams = Diff[List[Group]]
 
 
-@dataclass
+@dataclass(slots=True)
 class Entry:
     type: ActionType 
     action: Action
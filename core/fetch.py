@@ -0,0 +1,67 @@
+import asyncio
+import contextlib
+import time
+from typing import AsyncIterator
+from urllib.parse import urlparse
+
+
+class FetchStats:
+    """Accumulated timings of requests made through a `FetchPool`"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.wait_time = 0.0        # total time spent waiting for a free slot
+        self.max_wait_time = 0.0
+        self.request_time = 0.0     # total time spent doing requests
+
+    def record(self, wait_time: float, request_time: float):
+        self.requests += 1
+        self.wait_time += wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+        self.request_time += request_time
+
+    def __str__(self):
+        if not self.requests:
+            return "no requests"
+        return (
+            f"{self.requests} requests, "
+            f"queue wait avg {self.wait_time / self.requests * 1000:.0f} ms / max {self.max_wait_time * 1000:.0f} ms, "
+            f"request time avg {self.request_time / self.requests * 1000:.0f} ms"
+        )
+
+
+class FetchPool:
+    """Limits how many requests to wikis may be in flight at once, globally and per host."""
+
+    def __init__(self, *, limit: int = 100, per_host_limit: int = 4):
+        self.limit = limit
+        self.per_host_limit = per_host_limit
+        self.stats = FetchStats()
+        self._global = asyncio.Semaphore(limit)
+        self._hosts: dict[str, asyncio.Semaphore] = {}
+        self.in_flight = 0
+
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc
+        semaphore = self._hosts.get(host)
+        if semaphore is None:
+            semaphore = self._hosts[host] = asyncio.Semaphore(self.per_host_limit)
+        return semaphore
+
+    @contextlib.asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[float]:
+        """Waits for a free slot for a request to the given url and holds it until the block exits.
+        Yields how long the wait took, in seconds."""
+        queued_at = time.perf_counter()
+        # the host slot is taken first, so requests queued behind a busy host don't hold global slots
+        async with self._host_semaphore(url), self._global:
+            started_at = time.perf_counter()
+            self.in_flight += 1
+            try:
+                yield started_at - queued_at
+            finally:
+                self.in_flight -= 1
+                self.stats.record(started_at - queued_at, time.perf_counter() - started_at)
@@ -0,0 +1,87 @@
+from typing import TYPE_CHECKING
+
+import aiohttp
+
+if TYPE_CHECKING:
+    from core.metrics import Metrics
+
+try:
+    # aiohttp decodes brotli responses if either of these is installed
+    import brotli  # type: ignore  # noqa: F401
+    HAS_BROTLI = True
+except ImportError:
+    try:
+        import brotlicffi  # type: ignore  # noqa: F401
+        HAS_BROTLI = True
+    except ImportError:
+        HAS_BROTLI = False
+
+ACCEPT_ENCODING = "gzip, deflate, br" if HAS_BROTLI else "gzip, deflate"
+
+
+class _NotModified:
+    """Returned instead of a response when a conditional request was answered with 304 Not Modified.
+    It's falsy, so code which skips empty responses skips unchanged ones as well"""
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return "NOT_MODIFIED"
+
+
+NOT_MODIFIED = _NotModified()
+
+
+def trace_config(metrics: "Metrics", name: str) -> aiohttp.TraceConfig:
+    """Counts new and reused connections, DNS cache hits and response encodings of a session"""
+    config = aiohttp.TraceConfig()
+
+    async def on_connection_create_end(session, ctx, params):
+        metrics.http_connections.inc(session=name, event="created")
+
+    async def on_connection_reuseconn(session, ctx, params):
+        metrics.http_connections.inc(session=name, event="reused")
+
+    async def on_dns_cache_hit(session, ctx, params):
+        metrics.http_dns_lookups.inc(session=name, result="hit")
+
+    async def on_dns_cache_miss(session, ctx, params):
+        metrics.http_dns_lookups.inc(session=name, result="miss")
+
+    async def on_request_end(session, ctx, params: aiohttp.TraceRequestEndParams):
+        metrics.http_responses.inc(session=name, encoding=params.response.headers.get("Content-Encoding", "identity"))
+
+    config.on_connection_create_end.append(on_connection_create_end)
+    config.on_connection_reuseconn.append(on_connection_reuseconn)
+    config.on_dns_cache_hit.append(on_dns_cache_hit)
+    config.on_dns_cache_miss.append(on_dns_cache_miss)
+    config.on_request_end.append(on_request_end)
+    config.freeze()
+    return config
+
+
+def make_session(
+    name: str,
+    metrics: "Metrics",
+    *,
+    limit: int = 100,
+    limit_per_host: int = 0,
+    keepalive_timeout: float = 30,
+    dns_ttl: int = 300,
+    headers: dict[str, str] | None = None
+) -> aiohttp.ClientSession:
+    """Creates a session with its own connection pool. Connections are kept alive for `keepalive_timeout` seconds
+    and DNS lookups are cached for `dns_ttl` seconds, so most requests skip both DNS and TLS handshakes"""
+    connector = aiohttp.TCPConnector(
+        limit=limit,
+        limit_per_host=limit_per_host,
+        keepalive_timeout=keepalive_timeout,
+        use_dns_cache=True,
+        ttl_dns_cache=dns_ttl,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        headers={"Accept-Encoding": ACCEPT_ENCODING, **(headers or {})},
+        trace_configs=[trace_config(metrics, name)],
+    )
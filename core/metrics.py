@@ -0,0 +1,208 @@
+import asyncio
+import contextlib
+import time
+from typing import TYPE_CHECKING, Callable, Iterator
+
+from aiohttp import web
+
+if TYPE_CHECKING:
+    from core.client import Venus
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base class for all metrics. Metrics are rendered in Prometheus text format"""
+    type: str
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[tuple[str, dict[str, str], float]]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}"
+        ]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        for key, value in self._values.items():
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+
+class Gauge(Metric):
+    """Gauge which value is read from a callback at scrape time"""
+    type = "gauge"
+
+    def __init__(self, name, documentation, callback: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def samples(self):
+        yield self.name, {}, self.callback()
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}    # key -> (bucket counts, [sum])
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        if key not in self._values:
+            self._values[key] = ([0] * len(self.buckets), [0.0])
+        counts, total = self._values[key]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        total[0] += value
+
+    @contextlib.contextmanager
+    def time(self, clock: Callable[[], float] = time.perf_counter, **labels):
+        """Observes how long the block took. Pass `time.process_time` as clock to measure CPU time"""
+        start = clock()
+        try:
+            yield
+        finally:
+            self.observe(clock() - start, **labels)
+
+    def samples(self):
+        for key, (counts, total) in self._values.items():
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield f"{self.name}_sum", labels, total[0]
+            yield f"{self.name}_count", labels, cumulative
+
+
+class WikiHistogram:
+    """A pair of histograms: an aggregate one and, if enabled, one with a series for every wiki"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, *, per_wiki: bool = False):
+        self.total = Histogram(f"venus_{name}", documentation, labelnames, buckets)
+        self.per_wiki = Histogram(f"venus_wiki_{name}", documentation + " Per wiki.", ("wiki",) + labelnames, buckets) if per_wiki else None
+
+    def observe(self, value: float, wiki: str, **labels):
+        self.total.observe(value, **labels)
+        if self.per_wiki is not None:
+            self.per_wiki.observe(value, wiki=wiki, **labels)
+
+    @contextlib.contextmanager
+    def time(self, wiki: str, clock: Callable[[], float] = time.perf_counter, **labels):
+        start = clock()
+        try:
+            yield
+        finally:
+            self.observe(clock() - start, wiki, **labels)
+
+    def metrics(self) -> list[Histogram]:
+        return [self.total] if self.per_wiki is None else [self.total, self.per_wiki]
+
+
+class Metrics:
+    """All metrics exposed by Venus"""
+
+    def __init__(self, client: "Venus", *, per_wiki: bool = False):
+        self.client = client
+
+        self.request_duration = WikiHistogram("request_duration_seconds", "Duration of requests to wikis.", ("api",), per_wiki=per_wiki)
+        self.handler_cpu = WikiHistogram("handler_cpu_seconds", "CPU time spent in handlers.", ("handler",), per_wiki=per_wiki)
+        self.transport_prepare = WikiHistogram("transport_prepare_seconds", "Time spent preparing a message.", ("transport",), per_wiki=per_wiki)
+        self.transport_send = WikiHistogram("transport_send_seconds", "Duration of sending a message.", ("transport",), per_wiki=per_wiki)
+        self.entries = WikiHistogram("entries_per_cycle", "Number of entries handled in a cycle.", buckets=COUNT_BUCKETS, per_wiki=per_wiki)
+
+        self.fetch_wait = Histogram("venus_fetch_queue_wait_seconds", "Time requests waited for a free fetch slot.")
+        self.pool_acquire_wait = Histogram("venus_pool_acquire_wait_seconds", "Time spent waiting for a database connection.")
+        self.transport_errors = Counter("venus_transport_errors_total", "Number of entries which couldn't be prepared or sent.", ("transport",))
+        self.http_connections = Counter("venus_http_connections_total", "Number of HTTP connections which were created or reused.", ("session", "event"))
+        self.http_dns_lookups = Counter("venus_http_dns_lookups_total", "Number of DNS lookups by whether they were cached.", ("session", "result"))
+        self.http_responses = Counter("venus_http_responses_total", "Number of HTTP responses by content encoding.", ("session", "encoding"))
+        self.not_modified = Counter("venus_not_modified_total", "Number of conditional requests to wikis answered with 304 Not Modified.", ("endpoint",))
+        self.request_retries = Counter("venus_request_retries_total", "Number of retried requests to wikis.", ("api",))
+        self.user_id_lookups = Counter("venus_user_id_lookups_total", "Number of user ids looked up, by where they were found.", ("source",))
+
+        self.registry: list[Metric] = [
+            *self.request_duration.metrics(),
+            *self.handler_cpu.metrics(),
+            *self.transport_prepare.metrics(),
+            *self.transport_send.metrics(),
+            *self.entries.metrics(),
+            self.fetch_wait,
+            self.pool_acquire_wait,
+            self.transport_errors,
+            self.http_connections,
+            self.http_dns_lookups,
+            self.http_responses,
+            self.request_retries,
+            self.not_modified,
+            self.user_id_lookups,
+            Gauge("venus_requests_in_flight", "Number of requests to wikis in flight.", lambda: client.fetch_pool.in_flight),
+            Gauge("venus_cycles_in_flight", "Number of fetched cycles which weren't delivered yet.", lambda: sum(p.backlog for p in client.pipelines.values())),
+            Gauge("venus_wikis_polled", "Number of wikis polled by this worker.", lambda: len(client.pipelines)),
+            Gauge("venus_wikis_circuit_open", "Number of polled wikis which are failing and polled less often.", lambda: sum(
+                client.wikis[wiki_id].breaker.open for wiki_id in client.pipelines if wiki_id in client.wikis
+            )),
+            Gauge("venus_tasks", "Number of asyncio tasks.", lambda: len(asyncio.all_tasks(client.loop))),
+        ]
+
+    def render(self) -> str:
+        return "".join(metric.render() for metric in self.registry)
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.render(), content_type="text/plain", charset="utf-8")
+
+    async def serve(self, port: int, host: str = "0.0.0.0") -> web.AppRunner:
+        """Starts HTTP server exposing metrics at /metrics"""
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle_metrics)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        self.client.logger.info(f"Serving metrics at http://{host}:{port}/metrics")
+        return runner
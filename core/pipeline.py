@@ -0,0 +1,80 @@
+import asyncio
+from typing import TYPE_CHECKING, List, Optional
+
+from core.checkpoints import Checkpoint
+
+if TYPE_CHECKING:
+    from core.client import RCData, Venus
+    from core.entry import Entry
+    from fandom.wiki import Wiki
+
+
+class Pipeline:
+    """Handle → deliver stages for a single wiki.
+
+    Fetched data is passed between stages through bounded queues, and the number of cycles
+    which were fetched but not delivered yet is limited by `max_in_flight`. While the pipeline
+    is busy, the scheduler doesn't fetch the wiki again, so the skipped time window
+    is merged into the next one instead of piling up in memory.
+    """
+
+    def __init__(self, client: "Venus", wiki: "Wiki", *, max_in_flight: int = 1, queue_size: int = 1):
+        self.client = client
+        self.wiki = wiki
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0      # cycles which were submitted, but not delivered yet
+        self.skipped = 0        # polls skipped because the pipeline was busy
+
+        self.handle_queue: asyncio.Queue["RCData"] = asyncio.Queue(queue_size)
+        self.deliver_queue: asyncio.Queue[tuple[List["Entry"], Optional[Checkpoint]]] = asyncio.Queue(queue_size)
+        self.tasks = [
+            asyncio.create_task(self.handle_worker()),
+            asyncio.create_task(self.deliver_worker())
+        ]
+
+    @property
+    def busy(self) -> bool:
+        return self.in_flight >= self.max_in_flight
+
+    @property
+    def backlog(self) -> int:
+        """Number of cycles waiting in queues or being processed"""
+        return self.in_flight
+
+    async def submit(self, data: "RCData"):
+        """Passes fetched data to the handle stage"""
+        self.in_flight += 1
+        await self.handle_queue.put(data)
+
+    async def handle_worker(self):
+        while True:
+            data = await self.handle_queue.get()
+            try:
+                # chunks are delivered while the rest of the cycle is handled, only the last one has a checkpoint
+                async for entries, checkpoint in self.client.handle(data):
+                    await self.deliver_queue.put((entries, checkpoint))
+            except Exception:
+                self.client.logger.exception(f"Error while handling data for wiki {self.wiki.url}")
+                self.in_flight -= 1
+                self.client.profiler.cycle_done()
+            finally:
+                self.handle_queue.task_done()
+
+    async def deliver_worker(self):
+        while True:
+            entries, checkpoint = await self.deliver_queue.get()
+            try:
+                await self.client.deliver(self.wiki, entries, checkpoint)
+            except Exception:
+                self.client.logger.exception(f"Error while delivering data for wiki {self.wiki.url}")
+            finally:
+                if checkpoint is not None:
+                    # the last chunk of the cycle
+                    self.in_flight -= 1
+                    self.client.profiler.cycle_done()
+                self.deliver_queue.task_done()
+
+    def close(self):
+        """Stops the pipeline. Cycles which weren't delivered yet are dropped."""
+        for task in self.tasks:
+            task.cancel()
@@ -0,0 +1,42 @@
+import functools
+import typing
+from typing import Optional
+
+from core.entry import ActionType
+from core.utils import has_flag
+
+
+class FetchPlan(typing.NamedTuple):
+    """Describes which data has to be requested for a wiki"""
+    recent_changes_props: Optional[list[str]]   # None if recent changes are not needed
+    recent_changes_types: Optional[list[str]]
+    logevents_props: Optional[list[str]]        # None if log events are not needed
+    discussions: bool                           # whether social activity and posts are needed
+
+    @property
+    def rc(self) -> bool:
+        return self.recent_changes_props is not None or self.logevents_props is not None
+
+
+@functools.lru_cache
+def plan_fetch(actions: int) -> FetchPlan:
+    """Returns a fetch plan for the given mask of actions. Only the data handlers use is requested."""
+    if has_flag(actions, ActionType.edit.value):
+        # fields used by RCHandler.handle_edit
+        recent_changes_props = ["user", "userid", "ids", "sizes", "title", "timestamp", "comment"]
+        recent_changes_types = ["edit", "new"]
+    else:
+        recent_changes_props = recent_changes_types = None
+
+    if has_flag(actions, ActionType.log.value):
+        # fields used by RCHandler.handle_log
+        logevents_props = ["user", "userid", "ids", "type", "title", "timestamp", "comment", "details"]
+    else:
+        logevents_props = None
+
+    return FetchPlan(
+        recent_changes_props=recent_changes_props,
+        recent_changes_types=recent_changes_types,
+        logevents_props=logevents_props,
+        discussions=has_flag(actions, ActionType.post.value)
+    )
@@ -0,0 +1,209 @@
+import asyncio
+import collections
+import contextlib
+import datetime
+import pathlib
+import sys
+import threading
+import weakref
+from types import CodeType, FrameType
+from typing import TYPE_CHECKING, Iterator, Optional
+
+from aiohttp import web
+
+if TYPE_CHECKING:
+    from core.client import Venus
+
+# the dict asyncio itself uses to track which task is running in which loop; it's safe to read from other threads
+_current_tasks: dict = getattr(asyncio.tasks, "_current_tasks", {})
+
+Tag = tuple[str, str]   # (wiki url, pipeline stage)
+UNTAGGED: Tag = ("-", "other")
+LOOP: Tag = ("-", "loop")
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is requested while another one is being taken"""
+    pass
+
+
+class Profiler:
+    """Sampling profiler for the event loop thread.
+
+    A background thread periodically takes the stack of the loop thread, so nothing has to be
+    instrumented and the overhead only depends on the sampling interval. Samples are tagged with
+    the wiki and the pipeline stage of the task which was running, see `stage`, and are written
+    in folded format understood by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, client: "Venus", *, directory: str | pathlib.Path = "profiles", cycles: int = 10):
+        self.client = client
+        self.directory = pathlib.Path(directory)
+        self.cycles = cycles
+        self._tags: weakref.WeakKeyDictionary[asyncio.Task, Tag] = weakref.WeakKeyDictionary()
+        self._names: dict[CodeType, str] = {}
+        self._counts: collections.Counter[tuple[Tag, tuple[str, ...]]] = collections.Counter()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._cycles_left = 0
+        self._cycles_done = asyncio.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    # tagging
+
+    @contextlib.contextmanager
+    def stage(self, wiki: str, stage: str) -> Iterator[None]:
+        """Tags samples of the current task, and of tasks it creates, with the wiki and the stage"""
+        task = asyncio.current_task()
+        if task is None:
+            yield
+            return
+        previous = self._tags.get(task)
+        self._tags[task] = (wiki, stage)
+        try:
+            yield
+        finally:
+            if previous is None:
+                self._tags.pop(task, None)
+            else:
+                self._tags[task] = previous
+
+    def task_factory(self, loop: asyncio.AbstractEventLoop, coro, **kwargs) -> asyncio.Task:
+        """Task factory which makes tasks inherit the tag of the task which created them, e.g. in `asyncio.gather`"""
+        task = asyncio.Task(coro, loop=loop, **kwargs)
+        parent = asyncio.current_task(loop)
+        if parent is not None and parent in self._tags:
+            self._tags[task] = self._tags[parent]
+        return task
+
+    def cycle_done(self):
+        """Called once a poll cycle of some wiki was delivered or dropped"""
+        if self._cycles_left > 0:
+            self._cycles_left -= 1
+            if self._cycles_left == 0:
+                self._cycles_done.set()
+
+    # sampling
+
+    def _frame_name(self, code: CodeType) -> str:
+        name = self._names.get(code)
+        if name is None:
+            name = self._names[code] = f"{code.co_name} ({pathlib.Path(code.co_filename).name}:{code.co_firstlineno})"
+        return name
+
+    def _sample(self, thread_id: int, loop: asyncio.AbstractEventLoop, interval: float):
+        while not self._stop.wait(interval):
+            frame: Optional[FrameType] = sys._current_frames().get(thread_id)
+            task = _current_tasks.get(loop)
+            # samples outside of any task are the loop waiting for events or running plain callbacks
+            tag = self._tags.get(task, UNTAGGED) if task is not None else LOOP
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_name(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self._counts[(tag, tuple(stack))] += 1
+
+    def start(self, interval: float = 0.005):
+        """Starts sampling the current thread every `interval` seconds"""
+        if self.running:
+            raise ProfilerBusy("A profile is already being taken")
+        self._counts.clear()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._sample,
+            args=(threading.get_ident(), asyncio.get_running_loop(), interval),
+            name="venus-profiler",
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> str:
+        """Stops sampling and returns the collected stacks in folded format"""
+        if self._thread is None:
+            return ""
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+        lines = []
+        for (tag, stack), count in self._counts.most_common():
+            lines.append(";".join(frame.replace(";", ":") for frame in (*tag, *stack)) + f" {count}")
+        return "\n".join(lines) + "\n"
+
+    async def profile(self, *, cycles: Optional[int] = None, seconds: Optional[float] = None, interval: float = 0.005) -> str:
+        """Samples until `cycles` poll cycles complete or `seconds` pass, whichever is first, and returns folded stacks"""
+        self.start(interval)
+        self._cycles_left = cycles or 0
+        self._cycles_done.clear()
+        try:
+            if cycles:
+                await asyncio.wait_for(self._cycles_done.wait(), seconds)
+            else:
+                await asyncio.sleep(seconds or 0)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._cycles_left = 0
+            folded = self.stop()
+        return folded
+
+    def _write(self, folded: str, name: str) -> pathlib.Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{name}-{datetime.datetime.utcnow():%Y%m%d-%H%M%S}.folded"
+        path.write_text(folded, encoding="utf-8")
+        return path
+
+    async def save(self, folded: str, name: str = "profile") -> pathlib.Path:
+        return await asyncio.get_running_loop().run_in_executor(None, self._write, folded, name)
+
+    # triggers
+
+    async def profile_cycles(self):
+        """Profiles the next `self.cycles` poll cycles and saves the result. Triggered by SIGUSR1"""
+        try:
+            self.client.logger.warning(f"Profiling the next {self.cycles} poll cycles...")
+            path = await self.save(await self.profile(cycles=self.cycles, seconds=600))
+        except ProfilerBusy:
+            self.client.logger.warning("A profile is already being taken, ignoring the request.")
+        else:
+            self.client.logger.warning(f"Saved profile to {path}")
+
+    async def run_continuous(self, *, interval: float = 0.05, period: float = 300):
+        """Samples at low rate until cancelled, saving a profile every `period` seconds"""
+        while True:
+            try:
+                folded = await self.profile(seconds=period, interval=interval)
+            except ProfilerBusy:
+                # an on-demand profile is being taken
+                await asyncio.sleep(period)
+                continue
+            await self.save(folded, "continuous")
+
+    async def handle_request(self, request: web.Request) -> web.Response:
+        """Admin endpoint: /debug/profile?cycles=N or ?seconds=S, responds with folded stacks"""
+        try:
+            cycles = int(request.query["cycles"]) if "cycles" in request.query else None
+            seconds = float(request.query.get("seconds", 30 if cycles is None else 300))
+            interval = float(request.query.get("interval", 0.005))
+        except ValueError:
+            raise web.HTTPBadRequest(text="cycles, seconds and interval must be numbers")
+        try:
+            folded = await self.profile(cycles=cycles, seconds=seconds, interval=interval)
+        except ProfilerBusy as e:
+            raise web.HTTPConflict(text=str(e))
+        await self.save(folded)
+        return web.Response(text=folded, content_type="text/plain", charset="utf-8")
+
+    async def serve(self, port: int, host: str = "127.0.0.1") -> web.AppRunner:
+        """Starts HTTP server exposing the profiler at /debug/profile. It has no authentication, so it only listens locally by default"""
+        app = web.Application()
+        app.router.add_get("/debug/profile", self.handle_request)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        self.client.logger.info(f"Serving profiler at http://{host}:{port}/debug/profile")
+        return runner
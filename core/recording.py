@@ -0,0 +1,203 @@
+import asyncio
+import datetime
+import gzip
+import json
+import pathlib
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Iterator, Optional
+
+from core.abc import Transport
+from core.decoding import decode
+from core.http import NOT_MODIFIED
+from fandom.wiki import Wiki
+
+if TYPE_CHECKING:
+    from core.client import Venus
+
+
+# never requested, replayed messages are only prepared
+REPLAY_WEBHOOK_URL = "https://discord.com/api/webhooks/100000000000000000/" + "0" * 68
+
+
+class ReplayMismatch(Exception):
+    """Raised when replayed code makes a request which wasn't recorded"""
+    pass
+
+
+def request_key(api: str, params: dict) -> tuple:
+    """Identifies a request by its api and params, the way they look after being saved to JSON"""
+    return (api, tuple(sorted((key, str(value)) for key, value in params.items())))
+
+
+class Recorder:
+    """Captures raw responses of wikis' api to disk.
+
+    Every poll cycle of a wiki is saved to its own gzipped file of JSON lines:
+    the first line describes the wiki and the time window, the rest are responses in order they were received.
+    Only requests made by the cycle itself are recorded, ones made concurrently (like siteinfo updates) are not.
+    """
+
+    def __init__(self, directory: str | pathlib.Path):
+        self.directory = pathlib.Path(directory)
+        self.cycles: dict[int, list[dict]] = {}
+
+    def start_cycle(self, wiki: Wiki):
+        self.cycles[wiki.id] = [{
+            "wiki": wiki.id,
+            "url": wiki.url,
+            "name": wiki.name,
+            "actions": wiki.actions,
+            "prev_time": wiki.prev_check_time and wiki.prev_check_time.isoformat(),
+            "time": wiki.last_check_time.isoformat(),
+            # rows up to these ids were already handled, replay has to skip them too
+            "last_rcid": wiki.last_rcid,
+            "last_logid": wiki.last_logid,
+            # recent changes are requested from here if a burst wasn't handled whole
+            "rc_resume_time": wiki.rc_resume_time and wiki.rc_resume_time.isoformat(),
+        }]
+
+    def record(self, wiki: Wiki, api: str, params: dict, status: int, body: bytes):
+        cycle = self.cycles.get(wiki.id)
+        if cycle is not None:
+            cycle.append({"api": api, "params": params, "status": status, "body": body.decode()})
+
+    def record_user_ids(self, wiki: Wiki, ids: dict[str, int]):
+        """Saves ids of users which were known without requesting the api, like ones from the cache"""
+        cycle = self.cycles.get(wiki.id)
+        if cycle is not None:
+            cycle[0].setdefault("user_ids", {}).update(ids)
+
+    def discard_cycle(self, wiki: Wiki):
+        self.cycles.pop(wiki.id, None)
+
+    def _write(self, cycle: list[dict]):
+        header = cycle[0]
+        directory = self.directory / str(header["wiki"])
+        directory.mkdir(parents=True, exist_ok=True)
+        name = datetime.datetime.fromisoformat(header["time"]).strftime("%Y%m%d%H%M%S%f") + ".jsonl.gz"
+        with gzip.open(directory / name, "wt", encoding="utf-8") as file:
+            for line in cycle:
+                file.write(json.dumps(line, ensure_ascii=False, default=str) + "\n")
+
+    async def finish_cycle(self, wiki: Wiki):
+        """Saves the current cycle of a wiki to disk"""
+        cycle = self.cycles.pop(wiki.id, None)
+        if cycle is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, cycle)
+
+
+class RecordedCycle:
+    """A poll cycle loaded from disk"""
+
+    def __init__(self, path: pathlib.Path):
+        with gzip.open(path, "rt", encoding="utf-8") as file:
+            lines = [json.loads(line) for line in file]
+        self.path = path
+        self.header = lines[0]
+        # requests made concurrently may be recorded in any order, so responses are matched by params
+        self.responses: dict[tuple, deque[dict]] = {}
+        for line in lines[1:]:
+            self.responses.setdefault(request_key(line["api"], line["params"]), deque()).append(line)
+
+    @property
+    def time(self) -> datetime.datetime:
+        return datetime.datetime.fromisoformat(self.header["time"])
+
+    @property
+    def prev_time(self) -> Optional[datetime.datetime]:
+        return self.header["prev_time"] and datetime.datetime.fromisoformat(self.header["prev_time"])
+
+    @property
+    def rc_resume_time(self) -> Optional[datetime.datetime]:
+        value = self.header.get("rc_resume_time")
+        return value and datetime.datetime.fromisoformat(value)
+
+    @property
+    def requests(self) -> int:
+        return sum(len(responses) for responses in self.responses.values())
+
+    @classmethod
+    def load_all(cls, directory: str | pathlib.Path) -> Iterator["RecordedCycle"]:
+        """Loads all cycles in the directory in the order they were recorded"""
+        paths = sorted(pathlib.Path(directory).glob("*/*.jsonl.gz"), key=lambda path: path.name)
+        for path in paths:
+            yield cls(path)
+
+
+class ReplayWiki(Wiki):
+    """Wiki which serves responses from a recorded cycle instead of doing requests"""
+
+    def __init__(self, cycle: RecordedCycle, client: "Venus"):
+        super().__init__(cycle.header["wiki"], cycle.header["url"], cycle.prev_time, client)  # type: ignore
+        self.name = cycle.header["name"]
+        self.last_rcid = cycle.header.get("last_rcid")
+        self.last_logid = cycle.header.get("last_logid")
+        self.rc_resume_time = cycle.rc_resume_time
+        for name, user_id in cycle.header.get("user_ids", {}).items():
+            self.user_ids.set(name, user_id)
+        self.cycle = cycle
+
+    def _next_response(self, api: str, params: dict, schema: Optional[type]):
+        try:
+            response = self.cycle.responses[request_key(api, params)].popleft()
+        except (KeyError, IndexError):
+            raise ReplayMismatch(f"Request to {api} with {params!r} wasn't recorded in {self.cycle.path}") from None
+        if response["status"] == 204:
+            return None
+        if response["status"] == 304:
+            return NOT_MODIFIED
+        return decode(response["body"], schema)
+
+    async def query_mw(self, params, schema: Optional[type] = None, endpoint: Optional[str] = None, record: bool = False):
+        return self._next_response("mw", params, schema)
+
+    async def query_nirvana(self, *, schema: Optional[type] = None, endpoint: Optional[str] = None, record: bool = False, **params):
+        params["format"] = "json"
+        return self._next_response("nirvana", params, schema)
+
+
+class CountingTransport(Transport):
+    """Transport which only counts entries it would send. If `render` is set, messages are prepared with `render`"""
+
+    def __init__(self, wiki, actions, client, render: Optional[Transport] = None):
+        super().__init__(wiki, None, actions, client)
+        self.render = render
+        self.count = 0
+
+    def prepare(self, data):
+        if self.render is not None:
+            return self.render.prepare(data)
+        return data
+
+    async def send(self, message):
+        self.count += 1
+
+
+async def replay(client: "Venus", directory: str | pathlib.Path, *, render: bool = False) -> dict[str, float]:
+    """Feeds recorded cycles through `Venus.handle` as fast as possible and returns statistics"""
+    from transports.discord import DiscordTransport
+
+    stats = {"cycles": 0, "requests": 0, "entries": 0, "sent": 0}
+    start = time.perf_counter()
+    for cycle in RecordedCycle.load_all(directory):
+        wiki = ReplayWiki(cycle, client)
+        renderer = DiscordTransport(wiki, REPLAY_WEBHOOK_URL, cycle.header["actions"], client) if render else None
+        transport = CountingTransport(wiki, cycle.header["actions"], client, renderer)
+        wiki.transports.append(transport)
+        stats["requests"] += cycle.requests
+
+        data = client.check_data(await client.fetch_data(wiki))
+        # fetch_data moves the window to the current time, but the recorded one has to be used
+        wiki.last_check_time = cycle.time
+        if data is None:
+            continue
+
+        async for entries, _ in client.handle(data._replace(time=cycle.time)):
+            await transport.execute(entries)
+            stats["entries"] += len(entries)
+        stats["cycles"] += 1
+        stats["sent"] += transport.count
+
+    stats["elapsed"] = time.perf_counter() - start
+    return stats
@@ -0,0 +1,90 @@
+import datetime
+import email.utils
+import random
+from typing import Optional
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class RequestFailed(Exception):
+    """Raised when a wiki responds with an error status"""
+
+    def __init__(self, url: str, status: int, retry_after: Optional[float] = None):
+        super().__init__(f"{url} responded with status {status}")
+        self.url = url
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status in RETRY_STATUSES or self.retry_after is not None
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parses Retry-After header, which is either a number of seconds or a date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (date - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+class RetryPolicy:
+    """Bounded retries with exponential backoff and full jitter.
+
+    A retry waits a random time up to `base_delay * 2 ** attempt`, but never less than the server
+    asked for in Retry-After. If the server asks to wait longer than `max_delay`, the request isn't retried.
+    """
+
+    def __init__(self, *, attempts: int = 3, base_delay: float = 0.5, max_delay: float = 30):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """Returns how long to wait before retrying after `attempt` failed attempts, or None to give up"""
+        if attempt >= self.attempts - 1:
+            return None
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if retry_after is not None:
+            if retry_after > self.max_delay:
+                return None
+            delay = max(delay, retry_after)
+        return delay
+
+
+class CircuitBreaker:
+    """Counts consecutive failed poll cycles of a wiki.
+
+    After `threshold` failures in a row the breaker opens, and the wiki is only polled every `cooldown` seconds,
+    doubling after every poll which fails again, up to `max_cooldown`. A single successful poll closes it.
+    """
+
+    def __init__(self, *, threshold: int = 3, cooldown: float = 60, max_cooldown: float = 3600):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failures = 0
+
+    @property
+    def open(self) -> bool:
+        return self.failures >= self.threshold
+
+    @property
+    def cooldown(self) -> float:
+        """How long to wait before polling the wiki again while the breaker is open"""
+        return min(self.max_cooldown, self.base_cooldown * 2 ** max(0, self.failures - self.threshold))
+
+    def record_success(self):
+        self.failures = 0
+
+    def record_failure(self) -> bool:
+        """Records a failed poll. Returns True if the breaker has just opened"""
+        self.failures += 1
+        return self.failures == self.threshold
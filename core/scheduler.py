@@ -0,0 +1,106 @@
+import asyncio
+import heapq
+import itertools
+import random
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from fandom.wiki import Wiki
+
+
+class Scheduler:
+    """Priority queue of wikis ordered by the time they are due to be polled.
+
+    Every wiki has its own polling interval which follows the wiki's recent entry rate:
+    busy wikis are polled up to every `min_interval` seconds, while quiet ones gradually
+    back off to `max_interval`. Due times are jittered, so polls stay spread out in time.
+    """
+
+    def __init__(
+        self,
+        *,
+        min_interval: float = 10,
+        max_interval: float = 300,
+        target_entries: float = 5,
+        smoothing: float = 0.3,
+        backoff: float = 1.5,
+        jitter: float = 0.1
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_entries = target_entries    # how many entries we'd like to receive per poll
+        self.smoothing = smoothing              # weight of the latest poll in the entry rate average
+        self.backoff = backoff                  # how fast the interval may grow for quiet wikis
+        self.jitter = jitter
+
+        self._queue: list[tuple[float, int, "Wiki"]] = []
+        self._counter = itertools.count()
+        self._scheduled: dict[int, int] = {}    # wiki id -> sequence number of its live queue item
+        self._changed = asyncio.Event()
+
+    def __len__(self):
+        return len(self._scheduled)
+
+    def __contains__(self, wiki: "Wiki") -> bool:
+        return wiki.id in self._scheduled
+
+    def _clamp(self, interval: float) -> float:
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def schedule(self, wiki: "Wiki", delay: float):
+        """Schedules a wiki to be polled in `delay` seconds, replacing its previous due time."""
+        seq = next(self._counter)
+        self._scheduled[wiki.id] = seq
+        heapq.heappush(self._queue, (asyncio.get_running_loop().time() + delay, seq, wiki))
+        self._changed.set()
+
+    def add(self, wiki: "Wiki"):
+        """Adds a new wiki. Its first poll happens at a random point within its interval."""
+        wiki.poll_interval = self._clamp(wiki.poll_interval or self.min_interval)
+        self.schedule(wiki, random.uniform(0, wiki.poll_interval))
+
+    def remove(self, wiki: "Wiki"):
+        """Removes a wiki from the schedule. It won't be returned by `due` anymore."""
+        self._scheduled.pop(wiki.id, None)
+
+    def reschedule(self, wiki: "Wiki", entries: int, elapsed: float):
+        """Updates wiki's entry rate after a poll that returned `entries` entries
+        for the last `elapsed` seconds and schedules its next poll."""
+        rate = entries / elapsed if elapsed > 0 else 0
+        wiki.entry_rate = self.smoothing * rate + (1 - self.smoothing) * wiki.entry_rate
+
+        # react to bursts immediately, but slow down only as the average rate decays
+        interval = wiki.poll_interval * self.backoff
+        if max(rate, wiki.entry_rate) > 0:
+            interval = min(interval, self.target_entries / max(rate, wiki.entry_rate))
+        wiki.poll_interval = self._clamp(interval)
+
+        self.schedule(wiki, wiki.poll_interval * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    async def due(self) -> list["Wiki"]:
+        """Waits until at least one wiki is due and returns all wikis which are due now.
+        Returned wikis are no longer scheduled until `schedule` or `reschedule` is called for them."""
+        loop = asyncio.get_running_loop()
+        while True:
+            # drop items which were replaced or removed
+            while self._queue and self._scheduled.get(self._queue[0][2].id) != self._queue[0][1]:
+                heapq.heappop(self._queue)
+
+            timeout = None
+            if self._queue:
+                now = loop.time()
+                if self._queue[0][0] <= now:
+                    result = []
+                    while self._queue and self._queue[0][0] <= now:
+                        _, seq, wiki = heapq.heappop(self._queue)
+                        if self._scheduled.get(wiki.id) == seq:
+                            del self._scheduled[wiki.id]
+                            result.append(wiki)
+                    return result
+                timeout = self._queue[0][0] - now
+
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
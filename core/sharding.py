@@ -0,0 +1,97 @@
+import math
+import random
+from typing import TYPE_CHECKING, Iterable, Optional
+
+import asyncpg
+
+if TYPE_CHECKING:
+    from core.client import Venus
+
+# keys of advisory locks are pairs of (namespace, id)
+WIKI_LOCK_NAMESPACE = 0x56454E      # "VEN"
+WORKER_LOCK_NAMESPACE = 0x56454F
+
+
+class ShardCoordinator:
+    """Splits wikis between all running Venus workers using Postgres advisory locks.
+
+    A worker polls only the wikis it holds a session-level advisory lock for. All locks are taken
+    on a dedicated connection, so when a worker dies, Postgres releases its locks together with
+    the connection and the remaining workers claim its wikis on their next rebalance.
+    """
+
+    def __init__(self, client: "Venus", *, expected_workers: int = 1):
+        self.client = client
+        self.expected_workers = expected_workers
+        # until all expected workers have registered once, the others are assumed to be starting up
+        self.all_started = expected_workers <= 1
+        self.conn: Optional[asyncpg.Connection] = None
+        self.owned: set[int] = set()
+
+    @property
+    def connected(self) -> bool:
+        return self.conn is not None and not self.conn.is_closed()
+
+    async def connect(self):
+        """Opens the lock connection and registers this worker"""
+        self.conn = await asyncpg.connect()
+        self.conn.add_termination_listener(self._on_connection_lost)
+        await self.conn.execute("SELECT pg_advisory_lock($1, pg_backend_pid())", WORKER_LOCK_NAMESPACE)
+        self.client.logger.info("Registered as a worker.")
+
+    async def close(self):
+        """Closes the lock connection, which releases all wikis"""
+        if self.conn is not None:
+            self.conn.remove_termination_listener(self._on_connection_lost)
+            await self.conn.close()
+            self.conn = None
+        self.owned.clear()
+
+    def _on_connection_lost(self, conn):
+        # all our locks are gone with the connection, so the wikis may be polled by other workers already
+        self.client.logger.error(f"Lost lock connection, dropping {len(self.owned)} wikis.")
+        self.owned.clear()
+        self.conn = None
+
+    async def share(self, total: int) -> int:
+        """Returns how many wikis this worker should own"""
+        assert self.conn is not None
+        workers = await self.conn.fetchval(
+            "SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' AND classid = $1 AND objsubid = 2 AND granted",
+            WORKER_LOCK_NAMESPACE
+        )
+        if workers >= self.expected_workers:
+            self.all_started = True
+        # once everyone has started, the share follows live workers, so wikis of a dead one are taken over
+        divisor = workers if self.all_started else max(workers, self.expected_workers)
+        return math.ceil(total / max(divisor, 1))
+
+    async def claim(self, wiki_ids: Iterable[int], limit: int) -> list[int]:
+        """Tries to lock up to `limit` of given wikis and returns ids of the locked ones"""
+        assert self.conn is not None
+        candidates = [wiki_id for wiki_id in wiki_ids if wiki_id not in self.owned]
+        if not candidates or limit <= 0:
+            return []
+
+        # shuffle, so workers don't fight over the same wikis
+        random.shuffle(candidates)
+        rows = await self.conn.fetch(
+            "SELECT id FROM unnest($2::integer[]) AS id WHERE pg_try_advisory_lock($1, id) LIMIT $3",
+            WIKI_LOCK_NAMESPACE,
+            candidates,
+            limit
+        )
+        claimed = [row["id"] for row in rows]
+        self.owned.update(claimed)
+        return claimed
+
+    async def release(self, wiki_ids: Iterable[int]):
+        """Unlocks given wikis, so other workers can claim them"""
+        wiki_ids = [wiki_id for wiki_id in wiki_ids if wiki_id in self.owned]
+        self.owned.difference_update(wiki_ids)
+        if wiki_ids and self.connected:
+            await self.conn.execute(  # type: ignore
+                "SELECT pg_advisory_unlock($1, id) FROM unnest($2::integer[]) AS id",
+                WIKI_LOCK_NAMESPACE,
+                wiki_ids
+            )
@@ -0,0 +1,33 @@
+-- migrate:up
+
+CREATE FUNCTION notify_config_change() RETURNS trigger AS $$
+DECLARE
+    wiki_id integer;
+BEGIN
+    IF TG_TABLE_NAME = 'wikis' THEN
+        wiki_id := COALESCE(NEW.id, OLD.id);
+    ELSE
+        wiki_id := COALESCE(NEW.wiki_id, OLD.wiki_id);
+        IF TG_OP = 'UPDATE' AND OLD.wiki_id <> NEW.wiki_id THEN
+            PERFORM pg_notify('venus_config', json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'id', OLD.wiki_id)::text);
+        END IF;
+    END IF;
+    PERFORM pg_notify('venus_config', json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'id', wiki_id)::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- last_check_time is updated all the time, so only changes of url are interesting
+CREATE TRIGGER wikis_notify_config_change
+    AFTER INSERT OR DELETE OR UPDATE OF url ON wikis
+    FOR EACH ROW EXECUTE FUNCTION notify_config_change();
+
+CREATE TRIGGER transports_notify_config_change
+    AFTER INSERT OR DELETE OR UPDATE ON transports
+    FOR EACH ROW EXECUTE FUNCTION notify_config_change();
+
+-- migrate:down
+
+DROP TRIGGER transports_notify_config_change ON transports;
+DROP TRIGGER wikis_notify_config_change ON wikis;
+DROP FUNCTION notify_config_change();
@@ -0,0 +1,13 @@
+-- migrate:up
+
+CREATE TABLE user_ids (
+    wiki_id integer NOT NULL REFERENCES wikis(id) ON DELETE CASCADE,
+    name text NOT NULL,
+    user_id integer NOT NULL,
+    updated_at timestamp without time zone NOT NULL,
+    PRIMARY KEY (wiki_id, name)
+);
+
+-- migrate:down
+
+DROP TABLE user_ids;
@@ -0,0 +1,14 @@
+-- migrate:up
+
+CREATE TABLE siteinfo (
+    wiki_id integer PRIMARY KEY REFERENCES wikis(id) ON DELETE CASCADE,
+    sitename text NOT NULL,
+    namespaces jsonb NOT NULL,
+    article_path text NOT NULL,
+    favicon text,
+    updated_at timestamp without time zone NOT NULL
+);
+
+-- migrate:down
+
+DROP TABLE siteinfo;
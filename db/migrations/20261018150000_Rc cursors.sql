@@ -0,0 +1,11 @@
+-- migrate:up
+
+ALTER TABLE wikis
+    ADD COLUMN last_rcid bigint,
+    ADD COLUMN last_logid bigint;
+
+-- migrate:down
+
+ALTER TABLE wikis
+    DROP COLUMN last_rcid,
+    DROP COLUMN last_logid;
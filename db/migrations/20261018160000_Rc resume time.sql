@@ -0,0 +1,9 @@
+-- migrate:up
+
+ALTER TABLE wikis
+    ADD COLUMN rc_resume_time timestamp without time zone;
+
+-- migrate:down
+
+ALTER TABLE wikis
+    DROP COLUMN rc_resume_time;
@@ -9,6 +9,30 @@ SET xmloption = content;
 SET client_min_messages = warning;
 SET row_security = off;
 
+--
+-- Name: notify_config_change(); Type: FUNCTION; Schema: public; Owner: -
+--
+
+CREATE FUNCTION public.notify_config_change() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    wiki_id integer;
+BEGIN
+    IF TG_TABLE_NAME = 'wikis' THEN
+        wiki_id := COALESCE(NEW.id, OLD.id);
+    ELSE
+        wiki_id := COALESCE(NEW.wiki_id, OLD.wiki_id);
+        IF TG_OP = 'UPDATE' AND OLD.wiki_id <> NEW.wiki_id THEN
+            PERFORM pg_notify('venus_config', json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'id', OLD.wiki_id)::text);
+        END IF;
+    END IF;
+    PERFORM pg_notify('venus_config', json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'id', wiki_id)::text);
+    RETURN NULL;
+END;
+$$;
+
+
 SET default_tablespace = '';
 
 SET default_table_access_method = heap;
@@ -22,6 +46,20 @@ CREATE TABLE public.schema_migrations (
 );
 
 
+--
+-- Name: siteinfo; Type: TABLE; Schema: public; Owner: -
+--
+
+CREATE TABLE public.siteinfo (
+    wiki_id integer NOT NULL,
+    sitename text NOT NULL,
+    namespaces jsonb NOT NULL,
+    article_path text NOT NULL,
+    favicon text,
+    updated_at timestamp without time zone NOT NULL
+);
+
+
 --
 -- Name: transports; Type: TABLE; Schema: public; Owner: -
 --
@@ -34,6 +72,18 @@ CREATE TABLE public.transports (
 );
 
 
+--
+-- Name: user_ids; Type: TABLE; Schema: public; Owner: -
+--
+
+CREATE TABLE public.user_ids (
+    wiki_id integer NOT NULL,
+    name text NOT NULL,
+    user_id integer NOT NULL,
+    updated_at timestamp without time zone NOT NULL
+);
+
+
 --
 -- Name: wikis; Type: TABLE; Schema: public; Owner: -
 --
@@ -41,7 +91,10 @@ CREATE TABLE public.transports (
 CREATE TABLE public.wikis (
     id integer NOT NULL,
     url text NOT NULL,
-    last_check_time timestamp without time zone
+    last_check_time timestamp without time zone,
+    last_rcid bigint,
+    last_logid bigint,
+    rc_resume_time timestamp without time zone
 );
 
 
@@ -53,6 +106,22 @@ ALTER TABLE ONLY public.schema_migrations
     ADD CONSTRAINT schema_migrations_pkey PRIMARY KEY (version);
 
 
+--
+-- Name: siteinfo siteinfo_pkey; Type: CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.siteinfo
+    ADD CONSTRAINT siteinfo_pkey PRIMARY KEY (wiki_id);
+
+
+--
+-- Name: user_ids user_ids_pkey; Type: CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.user_ids
+    ADD CONSTRAINT user_ids_pkey PRIMARY KEY (wiki_id, name);
+
+
 --
 -- Name: wikis wikis_pkey; Type: CONSTRAINT; Schema: public; Owner: -
 --
@@ -69,6 +138,28 @@ ALTER TABLE ONLY public.wikis
     ADD CONSTRAINT wikis_url_key UNIQUE (url);
 
 
+--
+-- Name: transports transports_notify_config_change; Type: TRIGGER; Schema: public; Owner: -
+--
+
+CREATE TRIGGER transports_notify_config_change AFTER INSERT OR DELETE OR UPDATE ON public.transports FOR EACH ROW EXECUTE FUNCTION public.notify_config_change();
+
+
+--
+-- Name: wikis wikis_notify_config_change; Type: TRIGGER; Schema: public; Owner: -
+--
+
+CREATE TRIGGER wikis_notify_config_change AFTER INSERT OR DELETE OR UPDATE OF url ON public.wikis FOR EACH ROW EXECUTE FUNCTION public.notify_config_change();
+
+
+--
+-- Name: siteinfo siteinfo_wiki_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.siteinfo
+    ADD CONSTRAINT siteinfo_wiki_id_fkey FOREIGN KEY (wiki_id) REFERENCES public.wikis(id) ON DELETE CASCADE;
+
+
 --
 -- Name: transports transports_wiki_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: -
 --
@@ -77,6 +168,14 @@ ALTER TABLE ONLY public.transports
     ADD CONSTRAINT transports_wiki_id_fkey FOREIGN KEY (wiki_id) REFERENCES public.wikis(id);
 
 
+--
+-- Name: user_ids user_ids_wiki_id_fkey; Type: FK CONSTRAINT; Schema: public; Owner: -
+--
+
+ALTER TABLE ONLY public.user_ids
+    ADD CONSTRAINT user_ids_wiki_id_fkey FOREIGN KEY (wiki_id) REFERENCES public.wikis(id) ON DELETE CASCADE;
+
+
 --
 -- PostgreSQL database dump complete
 --
@@ -87,4 +186,9 @@ ALTER TABLE ONLY public.transports
 --
 
 INSERT INTO public.schema_migrations (version) VALUES
-    ('20211210211314');
+    ('20211210211314'),
+    ('20261018120000'),
+    ('20261018130000'),
+    ('20261018140000'),
+    ('20261018150000'),
+    ('20261018160000');
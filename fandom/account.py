@@ -4,7 +4,7 @@ from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from .wiki import Wiki
 
-@dataclass
+@dataclass(slots=True)
 class Account:
     """
     Represents an account on Fandom.
@@ -7,7 +7,7 @@ from .account import Account
 if TYPE_CHECKING:
     from .wiki import Wiki
 
-@dataclass
+@dataclass(slots=True)
 class Category:
     id: int
     title: str
@@ -17,7 +17,7 @@ class Category:
     def url(self):
         return f"{self.wiki.url}/f?catId={self.id}"
 
-@dataclass
+@dataclass(slots=True)
 class Thread:
     id: int
     title: Optional[str]
@@ -33,7 +33,7 @@ class Thread:
             return f"{self.parent.url}?commentId={self.id}"
         return self.parent.wiki.discussions_url(self.id)
 
-@dataclass
+@dataclass(slots=True)
 class Post:
     id: int
     text: str
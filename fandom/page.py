@@ -4,7 +4,7 @@ from typing import Optional, TYPE_CHECKING
 if TYPE_CHECKING:
     from .wiki import Wiki
 
-@dataclass
+@dataclass(slots=True)
 class PartialPage:
     name: str
     wiki: "Wiki"
@@ -13,12 +13,12 @@ class PartialPage:
     def url(self):
         return self.wiki.url_to(self.name)
     
-@dataclass
+@dataclass(slots=True)
 class Page(PartialPage):
     id: int
     namespace: int
 
-@dataclass
+@dataclass(slots=True)
 class File:
     page: Page
     name: str
@@ -34,7 +34,7 @@ class File:
             name=page.name
         )
 
-@dataclass
+@dataclass(slots=True)
 class PageVersion:
     id: int
     size: int
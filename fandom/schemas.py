@@ -0,0 +1,86 @@
+"""Schemas of api responses the handlers read, see `core.decoding.decode`.
+
+Only keys handlers use are listed, everything else is skipped while decoding. Keys are optional,
+since which of them are present depends on requested props and on what is hidden by the wiki.
+"""
+from typing import Any, Optional, TypedDict
+
+
+class RecentChange(TypedDict, total=False):
+    rcid: int
+    type: str
+    ns: int
+    title: str
+    pageid: int
+    revid: int
+    old_revid: int
+    user: str
+    userid: int
+    oldlen: int
+    newlen: int
+    timestamp: str
+    comment: str
+
+
+class LogEvent(TypedDict, total=False):
+    logid: int
+    type: str
+    action: str
+    ns: int
+    title: str
+    pageid: int
+    user: str
+    userid: int
+    timestamp: str
+    comment: str
+    params: dict[str, Any]
+
+
+class RCQuery(TypedDict, total=False):
+    recentchanges: list[RecentChange]
+    logevents: list[LogEvent]
+
+
+# list=recentchanges|logevents
+MWQueryResponse = TypedDict("MWQueryResponse", {
+    "query": RCQuery,
+    "continue": dict[str, Any],
+    "error": dict[str, Any],
+    "warnings": dict[str, Any],
+}, total=False)
+
+
+class ActivityAction(TypedDict, total=False):
+    actionType: str
+    contentType: str
+    time: str
+    label: str
+
+
+class ActivityDay(TypedDict):
+    date: str
+    actions: list[ActivityAction]
+
+
+# ActivityApiController.getSocialActivity
+SocialActivityResponse = list[ActivityDay]
+
+
+class CreationDate(TypedDict):
+    epochSecond: int
+
+
+class DiscussionPost(TypedDict, total=False):
+    id: str
+    threadId: str
+    isReply: bool
+    creationDate: CreationDate
+    jsonModel: Optional[str]
+
+
+PostsEmbedded = TypedDict("PostsEmbedded", {"doc:posts": list[DiscussionPost]}, total=False)
+
+
+class PostsResponse(TypedDict, total=False):
+    """DiscussionPost.getPosts"""
+    _embedded: PostsEmbedded
@@ -0,0 +1,44 @@
+import datetime
+import json
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+def _absolute(url: str) -> str:
+    # MediaWiki returns protocol-relative urls of the server and favicon
+    return "https:" + url if url.startswith("//") else url
+
+
+@dataclass
+class SiteInfo:
+    """
+    Metadata of a wiki which rarely changes.
+    """
+    sitename: str
+    article_path: str                                   # url of an article with $1 in place of its title
+    favicon: Optional[str] = None
+    namespaces: dict[int, str] = field(default_factory=dict)
+    updated_at: datetime.datetime = field(default_factory=datetime.datetime.utcnow)
+
+    @classmethod
+    def from_api(cls, query: dict) -> "SiteInfo":
+        """Builds siteinfo from the `query` of a meta=siteinfo&siprop=general|namespaces response"""
+        general = query["general"]
+        return cls(
+            sitename=general["sitename"],
+            article_path=_absolute(general.get("server", "")) + general.get("articlepath", "/wiki/$1"),
+            favicon=_absolute(general["favicon"]) if general.get("favicon") else None,
+            namespaces={int(ns_id): ns.get("*", ns.get("name", "")) for ns_id, ns in query.get("namespaces", {}).items()},
+        )
+
+    @classmethod
+    def from_json(cls, data: str) -> "SiteInfo":
+        """Builds siteinfo from a row of the siteinfo table serialized to JSON, with updated_at as a unix timestamp"""
+        row = json.loads(data)
+        return cls(
+            sitename=row["sitename"],
+            article_path=row["article_path"],
+            favicon=row["favicon"],
+            namespaces={int(ns_id): name for ns_id, name in row["namespaces"].items()},
+            updated_at=datetime.datetime.utcfromtimestamp(row["updated_at"]),
+        )
@@ -1,13 +1,36 @@
+import asyncio
 import datetime
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, AsyncIterator, Optional
 from urllib.parse import urlencode, quote
+
+import aiohttp
+
 from core.abc import Transport
+from core.cache import LRUCache
+from core.decoding import decode
+from core.http import NOT_MODIFIED
+from core.planner import FetchPlan, plan_fetch
+from core.resilience import RETRY_STATUSES, CircuitBreaker, RequestFailed, parse_retry_after
+from fandom.account import Account
+from fandom.page import Page
+from fandom.schemas import MWQueryResponse, PostsResponse, SocialActivityResponse
+from fandom.siteinfo import SiteInfo
 
 from transports import discord
 
 if TYPE_CHECKING:
     from core.client import Venus
 
+# bots make thousands of edits with the same summary, so rendered summaries are kept
+SUMMARY_CACHE_SIZE = 1000
+SUMMARY_CACHE_TTL = 3600
+# texts of posts rendered in previous cycles are kept, since getPosts returns the same posts many cycles in a row
+POST_CACHE_SIZE = 200
+POST_CACHE_TTL = 3600
+# the same accounts and pages show up in entry after entry, so they are shared instead of being built again
+ENTITY_CACHE_SIZE = 1000
+ENTITY_CACHE_TTL = 3600
+
 class InvalidTransportType(Exception):
     pass
 
@@ -16,15 +39,41 @@ class Wiki:
         self.url = url
         self.id = wiki_id
         self.name: Optional[str] = None
+        self.siteinfo: Optional[SiteInfo] = None
         self.last_check_time = last_check_time
         self.prev_check_time = last_check_time
+        # ids of the newest recent change and log event which were handled, older ones are skipped
+        self.last_rcid: Optional[int] = None
+        self.last_logid: Optional[int] = None
+        # set when a burst of recent changes wasn't handled whole, the next poll of recent changes starts there
+        self.rc_resume_time: Optional[datetime.datetime] = None
         self.client = client
         self.session = client.session
         self.transports: list[Transport] = []
+        self.validators: dict[str, tuple[Optional[str], Optional[str]]] = {}   # endpoint -> (ETag, Last-Modified) of its last response
+        self.summaries: LRUCache[tuple[str, Optional[str]], str] = LRUCache(SUMMARY_CACHE_SIZE, SUMMARY_CACHE_TTL)   # used by RCHandler
+        self.accounts: LRUCache[str, Account] = LRUCache(ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL)
+        self.pages: LRUCache[tuple[str, int, int], Page] = LRUCache(ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL)   # (name, id, namespace) -> page
+        self.post_texts: LRUCache[int, tuple[str, str]] = LRUCache(POST_CACHE_SIZE, POST_CACHE_TTL)     # post id -> (jsonModel, text), used by DiscussionsHandler
+        self.user_ids: LRUCache[str, int] = LRUCache(client.user_cache_size, client.user_cache_ttl)    # used by Venus.populate_ids
+
+        # polling state, managed by the scheduler
+        self.poll_interval: float = 0
+        self.entry_rate: float = 0
+        self.breaker = CircuitBreaker()
     
     @property
     def favicon(self):
+        if self.siteinfo is not None and self.siteinfo.favicon:
+            return self.siteinfo.favicon
         return f"https://www.google.com/s2/favicons?domain={self.url}"
+
+    def set_siteinfo(self, siteinfo: Optional[SiteInfo]):
+        """Replaces wiki metadata, or forgets it if `siteinfo` is None"""
+        self.siteinfo = siteinfo
+        self.name = siteinfo.sitename if siteinfo is not None else None
+        # links in rendered summaries depend on the article path
+        self.summaries.clear()
     
     @property
     def actions(self):
@@ -33,6 +82,11 @@ class Wiki:
             res |= transport.actions
         return res
     
+    @property
+    def fetch_plan(self) -> FetchPlan:
+        """Data which has to be fetched for the current set of transports"""
+        return plan_fetch(self.actions)
+
     def add_transport(self, type, url, actions):
         """Adds a new transport to the list of wiki transports."""
         if type == "discord":
@@ -45,7 +99,10 @@ class Wiki:
         page = quote(page.replace(' ', '_'))
         if namespace:
             namespace = quote(namespace.replace(' ', '_'))
-            url = f"{self.url}/wiki/{namespace}:{page}"
+            page = f"{namespace}:{page}"
+
+        if self.siteinfo is not None:
+            url = self.siteinfo.article_path.replace("$1", page)
         else:
             url = f"{self.url}/wiki/{page}"
 
@@ -54,6 +111,25 @@ class Wiki:
 
         return url
 
+    def get_account(self, name: str, id: int = 0) -> Account:
+        """Returns the account with this name, reusing the instance handed out before if there is one"""
+        account = self.accounts.get(name)
+        if account is None:
+            account = Account(name=name, id=id, wiki=self)
+            self.accounts.set(name, account)
+        elif id and not account.id:
+            account.id = id
+        return account
+
+    def get_page(self, name: str, id: int, namespace: int) -> Page:
+        """Returns the page with this name, id and namespace, reusing the instance handed out before if there is one"""
+        key = (name, id, namespace)
+        page = self.pages.get(key)
+        if page is None:
+            page = Page(name=name, id=id, namespace=namespace, wiki=self)
+            self.pages.set(key, page)
+        return page
+
     def discussions_url(self, thread_id, reply_id=None):
         """Returns URL to the given post in discussions"""
         url = f"{self.url}/f/p/{thread_id}"
@@ -65,38 +141,91 @@ class Wiki:
         """Returns URL to the given tag discussions"""
         return f"{self.url}/f/t/{article_name.replace(' ', '_')}"
 
-    async def query_mw(self, params):
-        """Performs request to MediaWiki api with given params"""
-        if self.name is None:
-            # retrieve name upon first request
-            if "meta" not in params:
-                params["meta"] = "siteinfo"
-            elif "siteinfo" not in params["meta"]:
-                params["meta"] += "|siteinfo"
-        
-        self.client.logger.debug(f"Requesting api for wiki {self.url} with params: {params!r}")
-        async with self.session.get(self.url + "/api.php", params=params) as resp:
-            res = await resp.json()
-            self.client.logger.debug(f"For request for wiki {self.url}, recieved {res}")
-            
-            if self.name is None:
-                self.name = res["query"]["general"]["sitename"]
+    async def request(self, api: str, path: str, params: dict, endpoint: Optional[str] = None) -> tuple[int, bytes]:
+        """Performs GET request to the wiki and returns status and body of the response.
+        Connection errors, 429 and 5xx responses and maxlag errors are retried according to the client's retry policy.
 
-            return res
+        If `endpoint` is given, the request is conditional on the ETag and Last-Modified of the endpoint's
+        previous response, and the status is 304 with an empty body if nothing changed since then."""
+        metrics = self.client.metrics
+        headers = {}
+        etag, last_modified = self.validators.get(endpoint, (None, None)) if endpoint else (None, None)
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                async with self.client.fetch_pool.slot(self.url) as wait_time:
+                    metrics.fetch_wait.observe(wait_time)
+                    with metrics.request_duration.time(self.url, api=api):
+                        async with self.session.get(self.url + path, params=params, headers=headers) as resp:
+                            body = await resp.read()
+                retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                if resp.status in RETRY_STATUSES or resp.headers.get("MediaWiki-API-Error") == "maxlag":
+                    error: Exception = RequestFailed(self.url + path, resp.status, retry_after)
+                elif resp.status >= 400:
+                    raise RequestFailed(self.url + path, resp.status)
+                else:
+                    if endpoint and resp.status == 304:
+                        metrics.not_modified.inc(endpoint=endpoint)
+                    elif endpoint:
+                        self.validators[endpoint] = (resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+                    return resp.status, body
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                error = e
 
-    async def query_nirvana(self, **params):
-        """Queries Nirvana with given params"""
+            delay = self.client.retry_policy.delay(attempt, retry_after)
+            if delay is None:
+                raise error
+            self.client.logger.debug(f"Request to {self.url + path} failed with {error!r}, retrying in {delay:.1f} seconds")
+            metrics.request_retries.inc(api=api)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def query_mw(self, params, schema: Optional[type] = None, endpoint: Optional[str] = None, record: bool = False):
+        """Performs request to MediaWiki api with given params. The response is decoded with `schema`, if given.
+        With `endpoint`, the request is conditional and NOT_MODIFIED is returned if the response didn't change.
+        With `record`, the response is saved to the poll cycle being recorded"""
+        self.client.logger.debug(f"Requesting api for wiki {self.url} with params: {params!r}")
+        status, body = await self.request("mw", "/api.php", params, endpoint)
+        if record and self.client.recorder is not None:
+            self.client.recorder.record(self, "mw", params, status, body)
+        if status == 304:
+            return NOT_MODIFIED
+        res = decode(body, schema)
+        # responses are only formatted if debug logging is enabled
+        self.client.logger.debug("For request for wiki %s, recieved %s", self.url, res)
+        return res
+
+    async def query_nirvana(self, *, schema: Optional[type] = None, endpoint: Optional[str] = None, record: bool = False, **params):
+        """Queries Nirvana with given params. The response is decoded with `schema`, if given.
+        With `endpoint`, the request is conditional and NOT_MODIFIED is returned if the response didn't change.
+        With `record`, the response is saved to the poll cycle being recorded"""
 
         if not self.url:
             raise RuntimeError("Wiki url is required to do this")
 
         params["format"] = "json"
-        async with self.session.get(self.url + "/wikia.php", params=params) as resp:
-            if resp.status != 204:
-                return await resp.json()
+        status, body = await self.request("nirvana", "/wikia.php", params, endpoint)
+        if record and self.client.recorder is not None:
+            self.client.recorder.record(self, "nirvana", params, status, body)
+        if status == 304:
+            return NOT_MODIFIED
+        if status != 204:
+            return decode(body, schema)
 
-    async def fetch_rc(self, *, limit=None, types=None, show=None, recent_changes_props=None, logevents_props=None, before=None, after=None, namespaces=None):
-        """Fetches recent changes data from MediaWiki api"""
+    async def fetch_siteinfo(self) -> SiteInfo:
+        """Fetches wiki metadata: its name, namespaces and paths"""
+        res = await self.query_mw(dict(action="query", meta="siteinfo", siprop="general|namespaces", format="json"))
+        return SiteInfo.from_api(res["query"])
+
+    async def fetch_rc(self, *, limit=None, types=None, show=None, recent_changes_props=None, logevents_props=None, before=None, after=None, namespaces=None, newer=False) -> AsyncIterator[dict]:
+        """Fetches recent changes data from MediaWiki api page by page, following continuation.
+        The next page is requested only after the previous one was consumed, so only one page is kept in memory.
+        Rows are listed newest first, or oldest first if `newer` is set."""
         
         to_query = []
         if recent_changes_props:
@@ -120,30 +249,45 @@ class Wiki:
             params["rcprop"] = "|".join(recent_changes_props)
         if logevents_props:
             params["leprop"] = "|".join(logevents_props)
+        # start is where listing begins, so it's the older bound when listing oldest first
+        older_bound, newer_bound = ("start", "end") if newer else ("end", "start")
+        if newer:
+            params["rcdir"] = "newer"
+            params["ledir"] = "newer"
         if after:
-            params["rcend"] = after.replace(microsecond=0).isoformat() + "Z"
-            params["leend"] = after.replace(microsecond=0).isoformat() + "Z"
+            params["rc" + older_bound] = after.replace(microsecond=0).isoformat() + "Z"
+            params["le" + older_bound] = after.replace(microsecond=0).isoformat() + "Z"
         if before:
-            params["rcstart"] = before.replace(microsecond=0).isoformat() + "Z"
-            params["lestart"] = before.replace(microsecond=0).isoformat() + "Z"
+            params["rc" + newer_bound] = before.replace(microsecond=0).isoformat() + "Z"
+            params["le" + newer_bound] = before.replace(microsecond=0).isoformat() + "Z"
         if namespaces:
             params["namespaces"] = "|".join([str(ns) for ns in namespaces])
         
-        return await self.query_mw(params)
+        # only the first page is requested conditionally, it's the one which changes when anything happens
+        endpoint: Optional[str] = "recentchanges"
+        while True:
+            res = await self.query_mw(dict(params), schema=MWQueryResponse, endpoint=endpoint, record=True)
+            yield res
+            endpoint = None
+            if not res or "continue" not in res:
+                break
+            # continuation values of modules which are done are dropped by api itself
+            params.update(res["continue"])
         
     async def fetch_social_activity(self, *, after=None):
-        """Fetches data about latest social activity"""
+        """Fetches data about latest social activity, or NOT_MODIFIED if there wasn't any since the last request"""
         params = {
             "uselang": "en"
         }
         if after:
             params["lastUpdateTime"] = after.timestamp()
             
-        data = await self.query_nirvana(controller="ActivityApiController", method="getSocialActivity", **params) or []
-
-        return data
+        data = await self.query_nirvana(controller="ActivityApiController", method="getSocialActivity", schema=SocialActivityResponse, endpoint="getSocialActivity", record=True, **params)
+        if data is NOT_MODIFIED:
+            return data
+        return data or []
     
     async def fetch_recent_posts(self):
-        """Fetches the list of recent posts."""
-        return await self.query_nirvana(controller="DiscussionPost", method="getPosts")
+        """Fetches the list of recent posts, or NOT_MODIFIED if it didn't change since the last request."""
+        return await self.query_nirvana(controller="DiscussionPost", method="getPosts", schema=PostsResponse, endpoint="getPosts", record=True)
     
\ No newline at end of file
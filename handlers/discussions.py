@@ -1,20 +1,24 @@
-import json
-from bs4 import BeautifulSoup, Tag
 import datetime
-from typing import TYPE_CHECKING, List, Literal, cast
-from urllib.parse import ParseResult, urlparse
+from typing import TYPE_CHECKING, List, Literal, NamedTuple, Optional
+from urllib.parse import urlparse
 
-from fandom.account import Account
 from fandom.discussions import Category, Post, Thread
 from fandom.page import PartialPage
 from fandom.wiki import Wiki
 from core.abc import Handler
+from core.decoding import decode
 from core.entry import Entry, Action, ActionType
 from core.utils import extract_query_param
+from handlers.labels import Label, parse_label
 
 if TYPE_CHECKING:
     from core.client import Venus
 
+POST_TEXT_LIMIT = 1024  # Discord's limit of an embed field
+# markup around blocks of a jsonModel document and before items of lists
+BLOCK_MARKUP = {"code_block": ("```", "```"), "paragraph": ("", "\n")}
+LIST_MARKERS = {"bulletList": "* ", "orderedList": "1. "}
+
 action_lookup = {
     "create": {
         "post": Action.create_post,
@@ -35,40 +39,68 @@ action_lookup = {
 }
 
 
+class PostIndex(NamedTuple):
+    """Posts of a getPosts response by id, and first posts of threads by thread id"""
+    posts: dict[int, dict]
+    first_posts: dict[int, dict]
+
+    @classmethod
+    def from_response(cls, response: Optional[dict]) -> "PostIndex":
+        posts: dict[int, dict] = {}
+        first_posts: dict[int, dict] = {}
+        for post in response["_embedded"]["doc:posts"] if response else []:
+            posts[int(post["id"])] = post
+            if not post.get("isReply", False):
+                first_posts[int(post["threadId"])] = post
+        return cls(posts, first_posts)
+
+    def find(self, thread_id: int, post_id: int, first: bool) -> Optional[dict]:
+        """Returns the first post of the thread if `first` is set, or the post with the given id otherwise"""
+        if first:
+            return self.first_posts.get(thread_id)
+        return self.posts.get(post_id)
+
+
 class DiscussionsHandler(Handler):
-    def __init__(self, client: "Venus", wiki: Wiki):
+    def __init__(self, client: "Venus", wiki: Wiki, since: Optional[datetime.datetime] = None):
         self.client = client
         self.wiki = wiki
+        # start of the fetched window, older actions were handled in previous cycles
+        self.since = since
+        self.post_texts = wiki.post_texts
         
     def get_action(self, data) -> Action:
         return action_lookup[data["actionType"]][data["contentType"]]
 
 
-    def parse_text_from_json(self, data) -> str:
-        text = ""
-        
-        match data["type"]:
-            case "code_block":
-                placeholder = "```{}```"
-            case "paragraph":
-                placeholder = "{}\n"
-            case _:
-                placeholder = "{}"
-        
-        content = data.get("content")
-        if content:
-            for node in content:
-                if data["type"] == "bulletList":
-                    text += "* "
-                elif data["type"] == "orderedList":
-                    text += "1. "
-                
-                text += self.parse_text_from_json(node)
-        
-        else:
-            if data["type"] == "text":
-                text = data["text"]
-                for mark in data.get("marks", []):
+    def parse_text_from_json(self, data, limit: int = POST_TEXT_LIMIT) -> str:
+        """Renders a jsonModel document as markdown. Rendering stops once `limit` characters are produced,
+        and longer texts are cut with an ellipsis"""
+        parts: List[str] = []
+        length = 0
+        # nodes which are yet to be rendered and markup around them, in reverse order
+        stack: list = [data]
+        while stack and length <= limit:
+            node = stack.pop()
+            if isinstance(node, str):
+                parts.append(node)
+                length += len(node)
+                continue
+
+            node_type = node["type"]
+            prefix, suffix = BLOCK_MARKUP.get(node_type, ("", ""))
+            if suffix:
+                stack.append(suffix)
+            content = node.get("content")
+            if content:
+                item_prefix = LIST_MARKERS.get(node_type)
+                for child in reversed(content):
+                    stack.append(child)
+                    if item_prefix:
+                        stack.append(item_prefix)
+            elif node_type == "text":
+                text = node["text"]
+                for mark in node.get("marks", []):
                     match mark:
                         case {'type': 'strong'}:
                             text = f"**{text}**"
@@ -76,29 +108,86 @@ class DiscussionsHandler(Handler):
                             text = f"*{text}*"
                         case {'type': 'link', 'attrs': {'href': url}}:
                             text = f"[{text}]({url})"
-                    
-        return placeholder.format(text)
+                stack.append(text)
+            if prefix:
+                stack.append(prefix)
+
+        text = "".join(parts)
+        if len(text) > limit:
+            text = text[:limit - 1] + "…"
+        return text
     
 
-    def get_text(self, action_type: Literal["create", "update"], soup: BeautifulSoup, post_data: dict | None) -> str:
-        if post_data is None or action_type == "update":
-            return cast(Tag, soup.find("em")).text
-        return self.parse_text_from_json(json.loads(post_data["jsonModel"])).strip()
+    def get_text(self, action_type: Literal["create", "update"], label: Label, post_data: dict | None) -> str:
+        json_model = post_data.get("jsonModel") if post_data is not None and action_type == "create" else None
+        if post_data is None or json_model is None:
+            if label.em is None:
+                raise ValueError("Label doesn't contain a snippet of the post")
+            return label.em
+
+        post_id = int(post_data["id"])
+        cached = self.post_texts.get(post_id)
+        if cached is not None and cached[0] == json_model:
+            return cached[1]
+        text = self.parse_text_from_json(decode(json_model)).strip()
+        self.post_texts.set(post_id, (json_model, text))
+        return text
+
+
+    def get_ids(self, content_type: str, label: Label) -> tuple[int, int]:
+        """Returns ids of the thread and the post an action is about. First posts have the id of their thread"""
+        url = urlparse(label.href(f"action-view__{content_type}"))
+        if content_type in ("post", "post-reply"):
+            thread_id = int(label.href(f"action-{content_type}__{content_type}").split("/")[-1])
+            return thread_id, int(url.path.split("/")[-1])
+
+        if content_type in ("message", "message-reply"):
+            if content_type == "message":
+                thread_class = "action-wall-message__message"
+            else:
+                thread_class = "action-reply-message-wall-parent__message-reply"
+            thread_id = int(extract_query_param(label.href(thread_class), "threadId"))  # type: ignore
+            try:
+                return thread_id, int(url.fragment)
+            except ValueError:
+                return thread_id, thread_id
+
+        if content_type in ("comment", "comment-reply"):
+            thread_id = int(extract_query_param(url, "commentId"))  # type: ignore
+            if content_type == "comment":
+                return thread_id, thread_id
+            return thread_id, int(extract_query_param(url, "replyId"))  # type: ignore
+
+        raise RuntimeError("Invalid data recieved")
+
 
+    def handle_entry(self, social_activity_data, posts: PostIndex, date: datetime.date) -> Optional[Entry]:
+        """Returns an entry for a social activity action, or None if the action was handled in a previous cycle"""
+        content_type = social_activity_data["contentType"]
+        action_type = social_activity_data["actionType"]
+        action = self.get_action(social_activity_data)
 
-    def handle_entry(self, social_activity_data, post_data, date: datetime.date) -> Entry:
+        label = parse_label(social_activity_data["label"])
+        thread_id, post_id = self.get_ids(content_type, label)
+        # edits aren't joined, getPosts only tells when a post was created
+        post_data = None
+        if action_type == "create":
+            post_data = posts.find(thread_id, post_id, first=content_type in ("post", "message", "comment"))
+
+        since = self.since
         if post_data is None:
             time = datetime.datetime.strptime(social_activity_data["time"], "%H:%M").time()
             timestamp = datetime.datetime.combine(date, time)
+            # the feed only has minutes, an action from the same minute as the last check may be newer than it
+            if since is not None:
+                since = since.replace(second=0, microsecond=0)
         else:
             timestamp = datetime.datetime.fromtimestamp(post_data["creationDate"]["epochSecond"])
-        content_type = social_activity_data["contentType"]
-        action_type = social_activity_data["actionType"]
-        action = self.get_action(social_activity_data)
+        if since is not None and timestamp < since:
+            return None
 
-        soup = BeautifulSoup(social_activity_data["label"])
-        author = cast(Tag, soup.find(attrs={"data-tracking": "action-username__" + content_type})).text
-        author_account = Account(name=author, id=0, wiki=self.wiki)
+        author = label.text("action-username__" + content_type)
+        author_account = self.wiki.get_account(author)
         
         posts: List[Post]
         if content_type in ("post", "post-reply"):
@@ -107,26 +196,23 @@ class DiscussionsHandler(Handler):
             else:
                 category_class = "action-post-reply-category__post-reply"
 
-            category_element = cast(Tag, soup.find(attrs={"data-tracking": category_class}))
             category = Category(
-                title=category_element.text,
-                id=int(extract_query_param(cast(str, category_element.get("href")), "catId")),  # type: ignore
+                title=label.text(category_class),
+                id=int(extract_query_param(label.href(category_class), "catId")),  # type: ignore
                 wiki=self.wiki
             )
 
-            thread_element = cast(Tag, soup.find(attrs={"data-tracking": f"action-{content_type}__{content_type}"}))
             thread = Thread(
-                id=int(cast(str, thread_element.get("href")).split("/")[-1]),
-                title=thread_element.text,
+                id=thread_id,
+                title=label.text(f"action-{content_type}__{content_type}"),
                 parent=category,
                 posts=[],
                 first_post=None
             )
 
-            post_link = cast(Tag, soup.find(attrs={"data-tracking": f"action-view__{content_type}"})).get("href")
             post = Post(
-                id=int(cast(str, post_link).split("/")[-1]),
-                text=self.get_text(action_type, soup, post_data),
+                id=post_id,
+                text=self.get_text(action_type, label, post_data),
                 parent=thread,
                 author=author_account,
                 timestamp=timestamp,
@@ -144,30 +230,20 @@ class DiscussionsHandler(Handler):
             else:
                 thread_class = "action-reply-message-wall-parent__message-reply"
             
-            # this is guaranteed to be ParseResult until the api breaks
-            url: ParseResult = urlparse(soup.find(attrs={"data-tracking": f"action-view__{content_type}"}).get("href")) # type: ignore
-            target_account = Account(
-                name=url.path.split(":")[-1].replace("_", " "),
-                id=0,
-                wiki=self.wiki
-            )
+            url = urlparse(label.href(f"action-view__{content_type}"))
+            target_account = self.wiki.get_account(url.path.split(":")[-1].replace("_", " "))
 
-            thread_element = cast(Tag, soup.find(attrs={"data-tracking": thread_class}))
             thread = Thread(
-                id=int(extract_query_param(cast(str, thread_element.get("href")), "threadId")),  # type: ignore
-                title=thread_element.text,
+                id=thread_id,
+                title=label.text(thread_class),
                 parent=target_account,
                 posts=[],
                 first_post=None
             )
             
-            try:
-                post_id = int(url.fragment)
-            except ValueError:
-                post_id = thread.id
             post = Post(
                 id=post_id,
-                text=self.get_text(action_type, soup, post_data),
+                text=self.get_text(action_type, label, post_data),
                 parent=thread,
                 author=author_account,
                 timestamp=timestamp,
@@ -185,16 +261,13 @@ class DiscussionsHandler(Handler):
             else:
                 page_class = "action-reply-article-name__comment-reply"
 
-            page_name = cast(Tag, soup.find(attrs={"data-tracking": page_class}))
             page = PartialPage(
-                name=page_name.text,
+                name=label.text(page_class),
                 wiki=self.wiki
             )
 
-            # this is guaranteed to be ParseResult until the api breaks
-            url: ParseResult = urlparse(soup.find(attrs={"data-tracking": f"action-view__{content_type}"}).get("href")) # type: ignore
             thread = Thread(
-                id=int(extract_query_param(url, "commentId")),  # type: ignore
+                id=thread_id,
                 title=None,
                 parent=page,
                 posts=[],
@@ -204,7 +277,7 @@ class DiscussionsHandler(Handler):
             if content_type == "comment":
                 first_post = Post(
                     id=thread.id,
-                    text=self.get_text(action_type, soup, post_data),
+                    text=self.get_text(action_type, label, post_data),
                     parent=thread,
                     author=author_account,
                     timestamp=timestamp,
@@ -213,16 +286,14 @@ class DiscussionsHandler(Handler):
             else:
                 first_post = Post(
                     id=thread.id,
-                    text=cast(Tag, soup.find(
-                        attrs={"data-tracking": f"action-reply-parent__comment-reply"}
-                    )).text,
+                    text=label.text("action-reply-parent__comment-reply"),
                     parent=thread,
                     author=None,
                     timestamp=None,
                 )
                 last_post = Post(
-                    id=int(extract_query_param(url, "replyId")),  # type: ignore
-                    text=self.get_text(action_type, soup, post_data),
+                    id=post_id,
+                    text=self.get_text(action_type, label, post_data),
                     parent=thread,
                     author=author_account,
                     timestamp=timestamp,
@@ -254,27 +325,17 @@ class DiscussionsHandler(Handler):
 
     def handle(self, data, posts) -> List[Entry]:
         result = []
-        curr_post_idx = 0
-        posts = posts["_embedded"]["doc:posts"]
+        index = PostIndex.from_response(posts)
         for day in data:
             date = datetime.datetime.strptime(day["date"], "%d %B %Y").date()
             for action in day["actions"]:
-                entry_action = self.get_action(action)
-                
                 try:
-                    if len(posts) > curr_post_idx:
-                        curr_post = posts[curr_post_idx] 
-                    else:
-                        curr_post = None
-                    entry = self.handle_entry(action, curr_post, date=date)
+                    entry = self.handle_entry(action, index, date=date)
                 except Exception:
                     self.client.logger.warn("Invalid entry recieved, failed to handle", exc_info=True)
                 else:
-                    if entry.timestamp >= self.wiki.prev_check_time:
+                    if entry is not None:
                         result.append(entry)
-                
-                if entry_action not in [Action.edit_comment, Action.edit_post, Action.edit_reply]:
-                    curr_post_idx += 1
 
         return result
     
@@ -0,0 +1,112 @@
+import html
+import re
+from typing import NamedTuple, Optional
+
+# a comment, or an opening, closing or self closing tag with its attributes.
+# quoted values may contain ">", a quote which is never closed is taken as a plain character
+TAG_REGEX = re.compile(r"""<!--.*?-->|<(/?)([a-zA-Z][^\s/>]*)((?:[^>"']|"[^"]*"|'[^']*'|"(?![^"]*")|'(?![^']*'))*)>""", re.DOTALL)
+ATTRIBUTE_REGEX = re.compile(r"""([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]*)))?""")
+
+# elements which never have a closing tag
+VOID_ELEMENTS = frozenset({"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"})
+
+
+class TrackedElement(NamedTuple):
+    text: str
+    href: Optional[str]
+
+
+class Label(NamedTuple):
+    """Elements of a social activity label: ones with a `data-tracking` attribute by its value,
+    and the text of the first `<em>`, which holds a snippet of the post"""
+    elements: dict[str, TrackedElement]
+    em: Optional[str]
+
+    def text(self, tracking: str) -> str:
+        return self.elements[tracking].text
+
+    def href(self, tracking: str) -> str:
+        href = self.elements[tracking].href
+        if href is None:
+            raise KeyError(f"Element {tracking} doesn't have a href")
+        return href
+
+
+def parse_attributes(text: str) -> dict[str, str]:
+    return {
+        match.group(1).lower(): html.unescape(next((value for value in match.group(2, 3, 4) if value is not None), ""))
+        for match in ATTRIBUTE_REGEX.finditer(text)
+    }
+
+
+def parse_label(label: str) -> Label:
+    """Extracts tracked elements and the post snippet from a social activity label in a single pass over its html.
+
+    Text of an element is collected the way BeautifulSoup's `.text` does: text of all nested elements,
+    with entities decoded. Like `soup.find`, only the first element with a given `data-tracking` counts.
+    """
+    elements: dict[str, TrackedElement] = {}
+    em: Optional[str] = None
+    seen_em = False
+    tags: list[str] = []
+    # elements which are being collected: (depth, data-tracking or None for <em>, href, pieces of text)
+    collecting: list[tuple[int, Optional[str], Optional[str], list[str]]] = []
+
+    def finish(depth: int, tracking: Optional[str], href: Optional[str], text: list[str]):
+        nonlocal em
+        if tracking is None:
+            em = "".join(text)
+        else:
+            elements[tracking] = TrackedElement("".join(text), href)
+
+    position = 0
+    for match in TAG_REGEX.finditer(label):
+        if collecting and match.start() > position:
+            text = label[position:match.start()]
+            if "&" in text:
+                text = html.unescape(text)
+            for element in collecting:
+                element[3].append(text)
+        position = match.end()
+
+        closing, tag, attributes = match.groups()
+        if tag is None:
+            # a comment
+            continue
+        tag = tag.lower()
+
+        if closing:
+            if tag in tags:
+                # unclosed elements are closed along with their parent
+                while tags.pop() != tag:
+                    pass
+                while collecting and collecting[-1][0] >= len(tags):
+                    finish(*collecting.pop())
+            continue
+        if tag in VOID_ELEMENTS:
+            continue
+
+        depth = len(tags)
+        tags.append(tag)
+        if "data-tracking" in attributes.lower():
+            attrs = parse_attributes(attributes)
+            tracking = attrs.get("data-tracking")
+            if tracking is not None and tracking not in elements and all(tracking != element[1] for element in collecting):
+                collecting.append((depth, tracking, attrs.get("href"), []))
+        if tag == "em" and not seen_em:
+            seen_em = True
+            collecting.append((depth, None, None, []))
+
+        if attributes.endswith("/"):
+            # a self closing element is empty
+            tags.pop()
+            while collecting and collecting[-1][0] >= depth:
+                finish(*collecting.pop())
+
+    if collecting and position < len(label):
+        text = html.unescape(label[position:])
+        for element in collecting:
+            element[3].append(text)
+    while collecting:
+        finish(*collecting.pop())
+    return Label(elements, em)
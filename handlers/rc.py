@@ -1,17 +1,26 @@
 from contextlib import suppress
+from dataclasses import fields
 from datetime import datetime
 import re
 import typing
 from typing import List, Optional
+from urllib.parse import quote
 
 from core.abc import Handler
 from core.entry import Action, ActionType, BlockParams, Diff, Entry, Group, ProtectionData, ProtectionLevel, ProtectionParams, RenameParams
-from fandom.account import Account
-from fandom.page import Page, PageVersion, File
+from fandom.page import PageVersion, File
 from fandom.wiki import Wiki
 
 
-WIKILINK_REGEX = re.compile(r"\[\[(.+?)(?:\|(.*?))?\]\]([^ `\n]+)?")
+# wikilinks, /* section */ autocomments and external links
+SUMMARY_REGEX = re.compile(
+    r"\[\[(?P<target>.+?)(?:\|(?P<title>.*?))?\]\](?P<trail>[a-z]+)?"
+    r"|/\*\s*(?P<section>.*?)\s*\*/"
+    r"|\[(?P<url>(?:https?:)?//[^\s\]]+)(?:\s+(?P<label>[^\]]*))?\]"
+)
+
+# ProtectionParams has slots, so protection types it doesn't know about are skipped
+PROTECTION_TYPES = frozenset(field.name for field in fields(ProtectionParams)) - {"cascade"}
 
 def from_mw_timestamp(timestamp) -> datetime:
     return datetime.fromisoformat(timestamp[:-1])
@@ -21,20 +30,17 @@ class RCHandler(Handler):
     def __init__(self, client, wiki: Wiki):
         self.client = client
         self.wiki = wiki
+        # rows up to these ids were handled in previous cycles
+        self.after_rcid = wiki.last_rcid
+        self.after_logid = wiki.last_logid
+        # the newest ids handled so far, including previous cycles
+        self.last_rcid = wiki.last_rcid
+        self.last_logid = wiki.last_logid
 
     def handle_edit(self, data) -> Entry:
-        author = Account(
-            name=data["user"],
-            id=data["userid"],
-            wiki=self.wiki
-        )
+        author = self.wiki.get_account(data["user"], data["userid"])
 
-        page = Page(
-            name=data["title"],
-            id=data["pageid"],
-            namespace=data["ns"],
-            wiki=self.wiki
-        )
+        page = self.wiki.get_page(data["title"], data["pageid"], data["ns"])
 
         old_version = PageVersion(
             id=data["old_revid"],
@@ -62,32 +68,18 @@ class RCHandler(Handler):
             target=page,
             wiki=self.wiki,
             user=author,
-            summary=self.render_summary(data["comment"]),
+            summary=self.render_summary(data["comment"], data["title"]),
             details=diff,
             timestamp=from_mw_timestamp(data["timestamp"])
         )
 
     def handle_log(self, data) -> Entry:
-        author = Account(
-            name=data["user"],
-            id=data["userid"],
-            wiki=self.wiki
-        )
+        author = self.wiki.get_account(data["user"], data["userid"])
 
         if data["type"] == "move":
             action = Action.rename_page
-            old_page = Page(
-                id=data["pageid"],
-                name=data["title"],
-                namespace=data["ns"],
-                wiki=self.wiki
-            )
-            new_page = Page(
-                id=data["pageid"],
-                name=data["params"]["target_title"],
-                namespace=data["params"]["target_ns"],
-                wiki=self.wiki
-            )
+            old_page = self.wiki.get_page(data["title"], data["pageid"], data["ns"])
+            new_page = self.wiki.get_page(data["params"]["target_title"], data["pageid"], data["params"]["target_ns"])
             target = old_page
             details = RenameParams(
                 diff=Diff(old=old_page, new=new_page),
@@ -99,12 +91,7 @@ class RCHandler(Handler):
             else:
                 action = Action.undelete_page
             
-            target = Page(
-                id=data["pageid"],
-                name=data["title"],
-                namespace=data["ns"],
-                wiki=self.wiki
-            )
+            target = self.wiki.get_page(data["title"], data["pageid"], data["ns"])
             details = None
         elif data["type"] == "upload":
             if data["action"] == "upload":
@@ -114,12 +101,7 @@ class RCHandler(Handler):
             else:
                 action = Action.revert_file
             
-            page = Page(
-                id=data["pageid"],
-                name=data["title"],
-                namespace=data["ns"],
-                wiki=self.wiki
-            )
+            page = self.wiki.get_page(data["title"], data["pageid"], data["ns"])
             target = File.from_page(page)
             details = None
         elif data["type"] == "protect":
@@ -141,14 +123,10 @@ class RCHandler(Handler):
                     level=ProtectionLevel(detail["level"]),
                     expiry=expiry
                 )
-                setattr(details, detail["type"], protection_data)
+                if detail["type"] in PROTECTION_TYPES:
+                    setattr(details, detail["type"], protection_data)
             
-            target = Page(
-                id=data["pageid"],
-                name=data["title"],
-                namespace=data["ns"],
-                wiki=self.wiki
-            )
+            target = self.wiki.get_page(data["title"], data["pageid"], data["ns"])
         elif data["type"] == "block":
             if data["action"] == "block":
                 action = Action.block_user
@@ -173,18 +151,10 @@ class RCHandler(Handler):
                     cannot_create_accounts="nocreate" in params["flags"]
                 )
 
-            target = Account(
-                name=data["title"].split(":", 1)[1],
-                id=0,
-                wiki=self.wiki
-            )
+            target = self.wiki.get_account(data["title"].split(":", 1)[1])
         elif data["type"] == "rights":
             action = Action.change_user_rights
-            target = Account(
-                name=data["title"].split(":", 1)[1],
-                id=0,
-                wiki=self.wiki
-            )
+            target = self.wiki.get_account(data["title"].split(":", 1)[1])
 
             old: List[Group] = []
             new: List[Group] = []
@@ -219,42 +189,81 @@ class RCHandler(Handler):
             target=target,
             wiki=self.wiki,
             user=author,
-            summary=self.render_summary(data["comment"]),
+            summary=self.render_summary(data["comment"], data.get("title")),
             details=details,
             timestamp=from_mw_timestamp(data["timestamp"])
         )
     
-    def link_to_hyperlink(self, match: typing.Match) -> str:
-        target: str = match.group(1)
-        title: Optional[str] = match.group(2)
+    def link_to_hyperlink(self, match: typing.Match, page: Optional[str] = None) -> str:
+        if match.group("section") is not None:
+            section = match.group("section")
+            if page is None:
+                return f"→{section}"
+            url = self.wiki.url_to(page) + "#" + quote(section.replace(" ", "_"))
+            return f"[→{section}](<{url}>)"
+
+        if match.group("url") is not None:
+            url = match.group("url")
+            if url.startswith("//"):
+                url = "https:" + url
+            return f"[{match.group('label') or url}](<{url}>)"
+
+        target: str = match.group("target")
+        title: Optional[str] = match.group("title")
 
         if title == "":
             title = target.split(":")[-1]
         if title is None:
             title = target
+        # letters right after a link are a part of its text, like in [[Mars]]s
+        title += match.group("trail") or ""
         
         url = self.wiki.url_to(target)
         return f"[{title}](<{url}>)"
 
-    def render_summary(self, text: Optional[str]) -> Optional[str]:
-        self.client.logger.debug("Rendering summary: " + str(text))
-        if text is None:
-            return None
+    def render_summary(self, text: Optional[str], page: Optional[str] = None) -> Optional[str]:
+        """Renders links of a summary of an edit to `page` as markdown. Results are cached per wiki"""
+        if not text:
+            return text
 
-        for match in WIKILINK_REGEX.finditer(text):
-            self.client.logger.debug("Match found: " + match.group(0))
-            text = text.replace(match.group(0), self.link_to_hyperlink(match), 1)
-        
-        return text
+        # only autocomments link to the page itself, other summaries are the same for every page
+        key = (text, page if "/*" in text else None)
+        rendered = self.wiki.summaries.get(key)
+        if rendered is None:
+            self.client.logger.debug("Rendering summary: %s", text)
+            rendered = SUMMARY_REGEX.sub(lambda match: self.link_to_hyperlink(match, page), text)
+            self.wiki.summaries.set(key, rendered)
+        return rendered
     
     def handle(self, data):
         handled_data: List[Entry] = []
 
-        for entry in data["query"]["recentchanges"]:
+        # lists which weren't requested are missing from the response
+        for entry in data["query"].get("recentchanges", []):
+            rcid = entry.get("rcid")
+            if rcid is not None:
+                if self.after_rcid is not None and rcid <= self.after_rcid:
+                    continue
+                self.last_rcid = max(rcid, self.last_rcid or 0)
             handled_data.append(self.handle_edit(entry))
 
-        for entry in data["query"]["logevents"]:
+        for entry in data["query"].get("logevents", []):
+            logid = entry.get("logid")
+            if logid is not None:
+                if self.after_logid is not None and logid <= self.after_logid:
+                    continue
+                self.last_logid = max(logid, self.last_logid or 0)
             with suppress(NotImplementedError):
                 handled_data.append(self.handle_log(entry))
         
         return handled_data
+
+    def resume_time(self, data) -> Optional[datetime]:
+        """For a page of rows requested oldest first, returns the time paging can be carried on from in another query:
+        the time of the newest row of lists which have more pages. None if all lists are done"""
+        times = []
+        for module, prefix in (("recentchanges", "rc"), ("logevents", "le")):
+            rows = data["query"].get(module)
+            if f"{prefix}continue" in data.get("continue", {}) and rows:
+                times.append(from_mw_timestamp(rows[-1]["timestamp"]))
+        return min(times, default=None)
@@ -0,0 +1,168 @@
+"""End-to-end load test against fake Fandom and Discord servers.
+
+Run from the repository root, against a database dedicated to load testing:
+
+    python -m loadtest --wikis 1000 --duration 120
+    python -m loadtest --wikis 50000 --workers 4 --error-rate 0.01 --reset
+
+The driver seeds `wikis` and `transports`, starts the fake servers and Venus workers,
+and after `--duration` seconds reports throughput and end-to-end latency, which is the time
+from the moment an entry happened on a wiki to the moment its message reached the webhook.
+"""
+import asyncio
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import time
+import urllib.request
+
+import asyncpg
+import click
+import discord.http
+
+from core.client import Venus
+from loadtest.server import serve
+
+ALL_ACTIONS = 0b111
+WEBHOOK_ID_BASE = 10 ** 17    # discord.py only accepts ids of at least 17 digits
+
+
+def run_worker(discord_base: str, options: dict):
+    """Runs a Venus worker which sends webhooks to the fake Discord"""
+    discord.http.Route.BASE = discord_base
+    Venus(log_level=int(os.environ.get("LOG_LEVEL", logging.WARN)), **options).run()
+
+
+async def seed(base_url: str, wikis: int, transports: int, reset: bool):
+    conn = await asyncpg.connect()
+    try:
+        if await conn.fetchval("SELECT EXISTS (SELECT 1 FROM wikis)"):
+            if not reset:
+                raise click.ClickException("The database already has wikis. Use a dedicated database, or pass --reset to delete them.")
+            await conn.execute("TRUNCATE wikis, transports CASCADE")
+
+        now = datetime.datetime.utcnow()
+        await conn.copy_records_to_table(
+            "wikis",
+            records=[(i, f"{base_url}/{i}", now) for i in range(1, wikis + 1)],
+            columns=["id", "url", "last_check_time"]
+        )
+        await conn.copy_records_to_table(
+            "transports",
+            records=[
+                (i, "discord", f"https://discord.com/api/webhooks/{WEBHOOK_ID_BASE + i * 100 + j}/{'a' * 68}", ALL_ACTIONS)
+                for i in range(1, wikis + 1) for j in range(transports)
+            ],
+            columns=["wiki_id", "type", "url", "actions"]
+        )
+    finally:
+        await conn.close()
+
+
+def request(url: str, method: str = "GET") -> bytes:
+    with urllib.request.urlopen(urllib.request.Request(url, method=method), timeout=10) as resp:
+        return resp.read()
+
+
+def wait_for(url: str, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            request(url)
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+@click.command(help="Runs Venus against fake Fandom and Discord servers and reports throughput and latency")
+@click.option("--wikis", default=1000, show_default=True, help="Number of wikis to seed.")
+@click.option("--transports", default=1, show_default=True, help="Number of Discord transports per wiki.")
+@click.option("--duration", default=60.0, show_default=True, help="How long to measure, in seconds.")
+@click.option("--warmup", default=10.0, show_default=True, help="How long to run before measuring, in seconds.")
+@click.option("--reset", is_flag=True, help="Delete wikis and transports which are already in the database.")
+@click.option("--host", default="127.0.0.1", show_default=True, help="Address of the fake servers.")
+@click.option("--port", default=8900, show_default=True, help="Port of the fake servers.")
+@click.option("--seed", "random_seed", default=0, show_default=True, help="Seed of generated activity.")
+# fake servers
+@click.option("--rate", default=1.0, show_default=True, help="Mean number of recent changes per wiki per minute.")
+@click.option("--discussions-rate", default=0.1, show_default=True, help="Mean number of discussions actions per wiki per minute.")
+@click.option("--latency", default=0.05, show_default=True, help="Latency of Fandom, in seconds.")
+@click.option("--jitter", default=0.5, show_default=True, help="Relative spread of latencies.")
+@click.option("--error-rate", default=0.0, show_default=True, help="Share of Fandom requests which fail with 503.")
+@click.option("--rate-limit-rate", default=0.0, show_default=True, help="Share of Fandom requests which fail with 429.")
+@click.option("--discord-latency", default=0.05, show_default=True, help="Latency of Discord, in seconds.")
+@click.option("--discord-error-rate", default=0.0, show_default=True, help="Share of webhook requests which fail with 503.")
+@click.option("--discord-limit", default=5, show_default=True, help="Requests per webhook per 2 seconds before 429. 0 disables the limit.")
+# workers
+@click.option("--workers", default=1, show_default=True, help="Number of Venus worker processes.")
+@click.option("--min-interval", default=10.0, show_default=True)
+@click.option("--max-interval", default=300.0, show_default=True)
+@click.option("--fetch-limit", default=100, show_default=True)
+@click.option("--fetch-host-limit", type=int, help="Defaults to --fetch-limit, as all fake wikis share one host.")
+@click.option("--max-in-flight", default=1, show_default=True)
+@click.option("--metrics-port", type=int, help="Port to serve metrics of the first worker on, the other workers use the next ports.")
+def main(wikis, transports, duration, warmup, reset, host, port, random_seed, workers, metrics_port, **options):
+    # Venus and Discord embeds use naive UTC times as local ones
+    os.environ["TZ"] = "UTC"
+    time.tzset()
+
+    server_options = {name: options.pop(name) for name in (
+        "rate", "discussions_rate", "latency", "jitter", "error_rate", "rate_limit_rate",
+        "discord_latency", "discord_error_rate", "discord_limit"
+    )}
+    if options["fetch_host_limit"] is None:
+        options["fetch_host_limit"] = options["fetch_limit"]
+    base_url = f"http://{host}:{port}"
+
+    server = multiprocessing.Process(
+        target=serve, args=(host, port), kwargs=dict(seed=random_seed, **server_options), name="venus-loadtest-server"
+    )
+    server.start()
+    processes = []
+    try:
+        wait_for(f"{base_url}/stats")
+        click.echo(f"Seeding {wikis} wikis with {transports} transport(s) each...")
+        asyncio.run(seed(base_url, wikis, transports, reset))
+
+        processes = [
+            multiprocessing.Process(
+                target=run_worker,
+                args=(f"{base_url}/api/v10", dict(workers=workers, metrics_port=metrics_port and metrics_port + i, **options)),
+                name=f"venus-worker-{i}"
+            )
+            for i in range(workers)
+        ]
+        for process in processes:
+            process.start()
+
+        click.echo(f"Warming up for {warmup:.0f}s...")
+        time.sleep(warmup)
+        request(f"{base_url}/stats/reset", method="POST")
+        click.echo(f"Measuring for {duration:.0f}s...")
+        time.sleep(duration)
+        stats = json.loads(request(f"{base_url}/stats"))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+        server.terminate()
+        server.join()
+
+    elapsed = stats.pop("elapsed")
+    latency = stats.pop("latency")
+    click.echo(f"{'elapsed':<22} {elapsed:>12.1f}s")
+    for name, value in sorted(stats.items()):
+        click.echo(f"{name:<22} {value:>12,} ({value / elapsed:,.1f}/s)")
+    if not latency:
+        click.echo("No messages were delivered.")
+    for name, value in latency.items():
+        click.echo(f"{'latency ' + name:<22} {value:>12.2f}s")
+
+
+if __name__ == "__main__":
+    main()
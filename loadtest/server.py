@@ -0,0 +1,293 @@
+"""Fake Fandom and Discord servers for load tests.
+
+Wiki number `n` lives at `/{n}`, so its `api.php` is `/{n}/api.php`. Recent changes and discussions
+are generated on request for the window the client asks for, with every wiki having its own activity rate.
+Discord webhooks are served at `/api/v10/webhooks/{id}/{token}` and measure the end-to-end latency
+from the moment an entry happened to the moment its message arrived.
+"""
+import asyncio
+import datetime
+import hashlib
+import json
+import math
+import random
+import time
+from typing import Optional
+
+from aiohttp import web
+
+from benchmarks.fixtures import Fixtures
+
+PAGE_SIZE = 500
+LOG_SHARE = 0.15    # share of recent changes which are log events
+
+
+def conditional(request: web.Request, data) -> web.Response:
+    """JSON response with an ETag, or 304 Not Modified if the client already has it"""
+    body = json.dumps(data).encode()
+    etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+    if request.headers.get("If-None-Match") == etag:
+        return web.Response(status=304, headers={"ETag": etag})
+    return web.Response(body=body, content_type="application/json", headers={"ETag": etag})
+
+
+def parse_mw_timestamp(value: str) -> datetime.datetime:
+    return datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ")
+
+
+def poisson(rnd: random.Random, mean: float) -> int:
+    """Draws the number of events which happened in a window with `mean` expected events"""
+    if mean <= 0:
+        return 0
+    if mean > 30:
+        return max(0, round(rnd.gauss(mean, math.sqrt(mean))))
+    limit, count, product = math.exp(-mean), 0, rnd.random()
+    while product > limit:
+        count += 1
+        product *= rnd.random()
+    return count
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {}
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return {"p50": pick(0.5), "p90": pick(0.9), "p99": pick(0.99), "max": values[-1]}
+
+
+class FakeFandom:
+    """Serves api.php, wikia.php and Discord webhooks with configurable activity and failures.
+
+    Rates are entries per minute. Each wiki's rate is drawn from an exponential distribution with the given mean,
+    so a few wikis are much busier than the rest, like in production. Probabilities apply to every request.
+    """
+
+    def __init__(
+        self,
+        *,
+        rate: float = 1.0,
+        discussions_rate: float = 0.1,
+        latency: float = 0.05,
+        jitter: float = 0.5,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        discord_latency: float = 0.05,
+        discord_error_rate: float = 0.0,
+        discord_limit: int = 5,
+        seed: int = 0
+    ):
+        self.rate = rate
+        self.discussions_rate = discussions_rate
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.discord_latency = discord_latency
+        self.discord_error_rate = discord_error_rate
+        self.discord_limit = discord_limit    # requests per webhook per 2 seconds, like Discord does
+        self.seed = seed
+        self.random = random.Random(seed)
+
+        self.rates: dict[int, tuple[float, float]] = {}
+        self.next_ids: dict[int, int] = {}
+        self.posts: dict[int, list[dict]] = {}
+        self.buckets: dict[str, tuple[float, int]] = {}    # webhook id -> (window start, requests in window)
+
+        self.started = time.time()
+        self.counters: dict[str, int] = {}
+        self.latencies: list[float] = []
+
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def wiki_rates(self, wiki: int) -> tuple[float, float]:
+        """Returns entries per second of recent changes and discussions of a wiki"""
+        if wiki not in self.rates:
+            rnd = random.Random(self.seed * 1_000_003 + wiki)
+            self.rates[wiki] = (
+                rnd.expovariate(60 / self.rate) if self.rate else 0,
+                rnd.expovariate(60 / self.discussions_rate) if self.discussions_rate else 0
+            )
+        return self.rates[wiki]
+
+    def fixtures(self, wiki: int, now: datetime.datetime, span: float) -> Fixtures:
+        fixtures = Fixtures(self.random.randrange(2 ** 32), now=now, span=max(1, int(span)))
+        # ids only grow, like rcid and logid do
+        fixtures.next_id = self.next_ids.get(wiki, 1000)
+        return fixtures
+
+    async def simulate(self, latency: float, error_rate: float, rate_limit_rate: float) -> Optional[web.Response]:
+        """Waits for the configured latency. Returns an error response if the request has to fail"""
+        await asyncio.sleep(latency * (1 + self.random.uniform(-self.jitter, self.jitter)))
+        if self.random.random() < rate_limit_rate:
+            self.count("rate_limited")
+            return web.Response(status=429, text="Too Many Requests", headers={"Retry-After": "1"})
+        if self.random.random() < error_rate:
+            self.count("errors")
+            return web.Response(status=503, text="Service Unavailable")
+        return None
+
+    # MediaWiki
+
+    def recent_changes(self, wiki: int, params) -> dict:
+        rc_rate, _ = self.wiki_rates(wiki)
+        # listing starts at rcstart, which is the newer bound unless rows are listed oldest first
+        newer_bound, older_bound = ("rcend", "rcstart") if params.get("rcdir") == "newer" else ("rcstart", "rcend")
+        before = parse_mw_timestamp(params[newer_bound]) if newer_bound in params else datetime.datetime.utcnow()
+        after = parse_mw_timestamp(params[older_bound]) if older_bound in params else before - datetime.timedelta(minutes=5)
+        span = max(0.0, (before - after).total_seconds())
+        fixtures = self.fixtures(wiki, before, span)
+
+        modules = params.get("list", "").split("|")
+        done = set(params.get("continue", "").split("|"))
+        query, cont, finished = {}, {}, []
+        for module, prefix, share in (("recentchanges", "rc", 1 - LOG_SHARE), ("logevents", "le", LOG_SHARE)):
+            if module not in modules or module in done:
+                continue
+            if f"{prefix}continue" in params:
+                remaining = int(params[f"{prefix}continue"])
+            else:
+                remaining = poisson(self.random, rc_rate * share * span)
+                self.count("generated", remaining)
+            page = min(remaining, PAGE_SIZE)
+            if module == "recentchanges":
+                query[module] = fixtures.query(edits=page, logs=0)["query"]["recentchanges"]
+            else:
+                query[module] = fixtures.query(edits=0, logs=page)["query"]["logevents"]
+            if remaining > page:
+                cont[f"{prefix}continue"] = str(remaining - page)
+            else:
+                finished.append(module)
+
+        self.next_ids[wiki] = fixtures.next_id
+        res: dict = {"batchcomplete": "", "query": query}
+        if cont:
+            cont["continue"] = "|".join(["-", *sorted(done - {"-", ""}), *finished])
+            res["continue"] = cont
+        return res
+
+    async def api(self, request: web.Request) -> web.Response:
+        wiki = int(request.match_info["wiki"])
+        self.count("api_requests")
+        if (error := await self.simulate(self.latency, self.error_rate, self.rate_limit_rate)) is not None:
+            return error
+
+        params = request.query
+        if params.get("list") == "users":
+            res = {"query": {"users": [
+                {"name": name, "userid": self.random.randrange(1, 50_000_000)}
+                for name in params["ususers"].replace("_", " ").split("|")
+            ]}}
+        else:
+            res = self.recent_changes(wiki, params)
+        if "siteinfo" in params.get("meta", ""):
+            res.setdefault("query", {}).update({
+                "general": {"sitename": f"Load test wiki {wiki}", "server": f"//{request.host}/{wiki}", "articlepath": "/wiki/$1"},
+                "namespaces": {"0": {"id": 0, "*": ""}, "2": {"id": 2, "*": "User"}, "6": {"id": 6, "*": "File"}},
+            })
+        return self.conditional(request, res)
+
+    # Nirvana
+
+    async def nirvana(self, request: web.Request) -> web.Response:
+        wiki = int(request.match_info["wiki"])
+        self.count("nirvana_requests")
+        if (error := await self.simulate(self.latency, self.error_rate, self.rate_limit_rate)) is not None:
+            return error
+
+        params = request.query
+        if params.get("method") == "getPosts":
+            return self.conditional(request, {"_embedded": {"doc:posts": self.posts.pop(wiki, [])}})
+
+        _, discussions_rate = self.wiki_rates(wiki)
+        now = datetime.datetime.utcnow()
+        after = datetime.datetime.utcfromtimestamp(float(params.get("lastUpdateTime", now.timestamp() - 300)))
+        span = max(0.0, (now - after).total_seconds())
+        actions = poisson(self.random, discussions_rate * span)
+        self.count("generated", actions)
+        if not actions:
+            return self.conditional(request, [])
+
+        fixtures = self.fixtures(wiki, now, span)
+        activity, posts = fixtures.discussions(actions, step=datetime.timedelta(seconds=span / actions))
+        self.next_ids[wiki] = fixtures.next_id
+        self.posts[wiki] = posts["_embedded"]["doc:posts"]
+        return self.conditional(request, activity)
+
+    def conditional(self, request: web.Request, data) -> web.Response:
+        response = conditional(request, data)
+        if response.status == 304:
+            self.count("not_modified")
+        return response
+
+    # Discord
+
+    async def webhook(self, request: web.Request) -> web.Response:
+        self.count("discord_requests")
+        webhook_id = request.match_info["webhook"]
+        now = time.time()
+
+        headers = {}
+        if self.discord_limit:
+            start, used = self.buckets.get(webhook_id, (now, 0))
+            if now - start >= 2:
+                start, used = now, 0
+            reset_after = max(0.0, start + 2 - now)
+            if used >= self.discord_limit:
+                self.count("discord_rate_limited")
+                # discord.py only retries rate limits which came through Discord's proxy
+                return web.json_response(
+                    {"message": "You are being rate limited.", "retry_after": reset_after, "global": False},
+                    status=429,
+                    headers={"Via": "1.1 google", "Retry-After": str(math.ceil(reset_after))}
+                )
+            self.buckets[webhook_id] = (start, used + 1)
+            headers = {
+                "X-RateLimit-Limit": str(self.discord_limit),
+                "X-RateLimit-Remaining": str(self.discord_limit - used - 1),
+                "X-RateLimit-Reset": str(start + 2),
+                "X-RateLimit-Reset-After": f"{reset_after:.3f}",
+                "X-RateLimit-Bucket": webhook_id,
+            }
+
+        if (error := await self.simulate(self.discord_latency, self.discord_error_rate, 0)) is not None:
+            return error
+
+        payload = await request.json()
+        arrived = time.time()
+        for embed in payload.get("embeds", []):
+            self.count("delivered")
+            if "timestamp" in embed:
+                happened = datetime.datetime.fromisoformat(embed["timestamp"])
+                if happened.tzinfo is None:
+                    happened = happened.replace(tzinfo=datetime.timezone.utc)
+                self.latencies.append(arrived - happened.timestamp())
+        return web.Response(status=204, headers=headers)
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "elapsed": time.time() - self.started,
+            **self.counters,
+            "latency": percentiles(self.latencies),
+        })
+
+    async def reset(self, request: web.Request) -> web.Response:
+        self.started = time.time()
+        self.counters.clear()
+        self.latencies.clear()
+        return web.Response(status=204)
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=8 * 1024 ** 2)
+        app.router.add_get("/{wiki:\\d+}/api.php", self.api)
+        app.router.add_get("/{wiki:\\d+}/wikia.php", self.nirvana)
+        app.router.add_post("/api/v10/webhooks/{webhook}/{token}", self.webhook)
+        app.router.add_get("/stats", self.stats)
+        app.router.add_post("/stats/reset", self.reset)
+        return app
+
+
+def serve(host: str, port: int, **options):
+    """Runs the fake servers until the process is terminated"""
+    web.run_app(FakeFandom(**options).app(), host=host, port=port, print=None, access_log=None)
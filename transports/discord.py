@@ -55,7 +55,7 @@ class DiscordTransport(Transport):
 
     def __init__(self, wiki, url, actions, client):
         super().__init__(wiki, url, actions, client)
-        self.webhook = Webhook.from_url(self.url, session=self.session)  
+        self.webhook = Webhook.from_url(self.url, session=self.client.discord_session)
 
     def prepare(self, data: "Entry") -> Embed:
         if data.type is ActionType.post:
@@ -297,12 +297,16 @@ class DiscordTransport(Transport):
         await self.webhook.send(embed=data)
 
     async def execute(self, data: list["Entry"]):
+        metrics = self.client.metrics
         for entry in data:
             if not self.can_send(entry):
                 continue
             try:
-                embed = self.prepare(entry)
+                with self.client.profiler.stage(self.wiki.url, "transport prepare"), metrics.transport_prepare.time(self.wiki.url, transport="discord"):
+                    embed = self.prepare(entry)
             except:
+                metrics.transport_errors.inc(transport="discord")
                 self.client.logger.exception("Error while processing entry")
             else:
-                await self.send(embed)
+                with metrics.transport_send.time(self.wiki.url, transport="discord"):
+                    await self.send(embed)